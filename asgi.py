@@ -0,0 +1,193 @@
+"""ASGI entry point serving the same Flask app, routes, JWT checks and responses as main.py.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 9090
+
+The request body is read and the response is written on the event loop, so a slow client only
+costs a coroutine, not a thread. Bodies up to ASGI_BODY_MEMORY_LIMIT bytes stay in memory; larger
+ones, such as a bulk book upload, are spooled to a temporary file. The Flask handler and each
+chunk of a streamed list response run on the service thread pool (SERVICE_WORKERS). Each request
+keeps one context for all of these calls, so its Flask request context and SQL stats follow it
+from thread to thread.
+"""
+import contextvars
+import logging
+import os
+import sys
+import tempfile
+
+from main import app as flask_app
+from services.async_services import iterate_blocking, run_blocking
+
+# Request bodies larger than this are spooled to a temporary file instead of kept in memory
+ASGI_BODY_MEMORY_LIMIT = int(os.environ.get('ASGI_BODY_MEMORY_LIMIT', 1024 * 1024))
+
+
+class AsgiApp:
+    """Adapt a WSGI application to ASGI, running it on the service thread pool."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    @staticmethod
+    async def _lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = await _read_body(receive)
+        if body is None:
+            return
+        try:
+            await self._respond(build_environ(scope, body), send)
+        finally:
+            body.close()
+
+    async def _respond(self, environ, send):
+        context = contextvars.copy_context()
+        try:
+            status, headers, first, chunks = await run_blocking(self._start, environ, context=context)
+        except Exception as e:
+            logging.error(f"Error: {e}")
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+            return
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if chunks is None:
+            await send({'type': 'http.response.body', 'body': first})
+            return
+        stream = iterate_blocking(chunks, context)
+        try:
+            await send({'type': 'http.response.body', 'body': first, 'more_body': True})
+            async for chunk in stream:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Also runs when the client goes away mid-stream, releasing the response's connection
+            await stream.aclose()
+
+    def _start(self, environ):
+        """Call the WSGI app; runs on a service thread.
+
+        Returns ``(status, headers, first chunk, remaining chunks)``. A response with a
+        Content-Length is already in memory, so it is read out whole here and the remaining
+        chunks are None. Otherwise the first chunk is read so headers and body can go out together.
+        """
+        started = []
+
+        def start_response(status, response_headers, exc_info=None):
+            started[:] = [status, response_headers]
+            return lambda data: None
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks = iter(result)
+            first = next(chunks, b'')
+            status, response_headers = started
+            status = int(status.split(' ', 1)[0])
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers]
+            if not any(name == b'content-length' for name, _ in headers):
+                return status, headers, first, _Closing(chunks, result)
+            body = first + b''.join(chunks)
+        except Exception:
+            _close(result)
+            raise
+        _close(result)
+        return status, headers, body, None
+
+
+async def _read_body(receive):
+    """Receive the whole request body on the event loop; None if the client disconnects first.
+
+    The body is read before the handler runs, so a slow upload never holds a service thread.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=ASGI_BODY_MEMORY_LIMIT)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return body
+
+
+class _Closing:
+    """Iterator over the rest of a WSGI response that closes the original result, as PEP 3333 requires."""
+
+    def __init__(self, chunks, result):
+        self.chunks = chunks
+        self.result = result
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        _close(self.result)
+
+
+def _close(result):
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its fully received, rewound ``body`` file."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    length = body.seek(0, os.SEEK_END)
+    body.seek(0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        # WSGI carries paths as bytes decoded with latin-1; werkzeug recovers the UTF-8 text
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', ()):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            continue
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+app = AsgiApp(flask_app)
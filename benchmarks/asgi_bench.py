@@ -0,0 +1,207 @@
+"""Compare how many concurrent connections the sync (WSGI) and async (ASGI) stacks can serve.
+
+    python -m benchmarks.asgi_bench --scale small --threads 8 --concurrency 8,64,256 --client-delay 20
+
+Both stacks run the same Flask app in-process against the same synthetic library, with the
+same number of threads. The sync stack models a threaded WSGI server: a connection holds one of
+--threads worker threads from the moment it is accepted until its last byte is written. The
+async stack serves every connection from one event loop through ``asgi.app`` and only borrows a
+service thread while Flask or SQLite is working. --client-delay simulates slow clients by
+making every body write take that many milliseconds; with slow clients the sync stack's
+throughput is capped at about threads / delay while the async stack keeps scaling.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from werkzeug.test import EnvironBuilder
+
+from benchmarks.http_load import DEFAULT_SECRET_KEY, ENDPOINTS, EndpointStats, library_ids, mint_tokens, parse_mix
+from benchmarks.synthetic import DEFAULT_SEED, SCALES, generate_library
+
+# Reads only by default, so both stacks see the same database from run to run
+DEFAULT_MIX = 'get_book=30,list_books=15,search_books=10,get_member=10,get_loan=10,list_member_loans=10'
+
+
+class RequestMix:
+    def __init__(self, weights, tokens, ids):
+        self.names = [name for name, weight in weights.items() if weight > 0]
+        self.cumulative = list(itertools.accumulate(weights[name] for name in self.names))
+        self.headers = {role: {'Authorization': f"Bearer {token}"} for role, token in tokens.items()}
+        # Keeps rows created by this run distinct from earlier runs with the same seed
+        self.ids = dict(ids, run=f"{time.time_ns():x}")
+
+    def next(self, rng):
+        """Return ``(method, path, query string, headers, JSON body or None)`` for a random request."""
+        name = rng.choices(self.names, cum_weights=self.cumulative)[0]
+        role, _, method, build = ENDPOINTS[name]
+        target, body = build(rng, self.ids)
+        parts = urlsplit(target)
+        return method, parts.path, parts.query, self.headers[role], body
+
+
+def run_sync(app, mix, concurrency, threads, duration, client_delay, seed):
+    """One client thread per connection, served by a fixed pool of server threads."""
+    server = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def handle(environ):
+        started = []
+        result = app(environ, lambda status, headers, exc_info=None: started.append(status))
+        try:
+            for chunk in result:
+                if chunk and client_delay:
+                    # A blocking socket write to a slow client keeps the server thread busy
+                    time.sleep(client_delay)
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        return int(started[-1].split(' ', 1)[0])
+
+    stats = EndpointStats()
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = []
+
+    def client(index):
+        rng = random.Random(seed + index)
+        local = EndpointStats()
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            method, path, query, headers, body = mix.next(rng)
+            environ = EnvironBuilder(path=path, query_string=query, method=method, headers=headers,
+                                     json=body).get_environ()
+            start = time.perf_counter()
+            status = server.submit(handle, environ).result()
+            local.record(time.perf_counter() - start, status)
+        with lock:
+            stats.merge(local)
+
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    deadline.append(time.perf_counter() + duration)
+    start = time.perf_counter()
+    barrier.wait()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    return stats, elapsed
+
+
+def run_async(app, mix, concurrency, duration, client_delay, seed):
+    """One coroutine per connection on a single event loop, calling the ASGI app directly."""
+    async def client(index, deadline, stats):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            method, path, query, headers, body = mix.next(rng)
+            payload = json.dumps(body).encode() if body is not None else b''
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+                'method': method, 'path': path, 'root_path': '', 'query_string': query.encode('latin-1'),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+                + [(b'content-type', b'application/json')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 50000 + index),
+            }
+            status = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': payload}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message.get('body') and client_delay:
+                    await asyncio.sleep(client_delay)
+
+            start = time.perf_counter()
+            await app(scope, receive, send)
+            stats.record(time.perf_counter() - start, status[0] if status else 599)
+
+    async def run():
+        stats = EndpointStats()
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client(index, deadline, stats) for index in range(concurrency)))
+        return stats
+
+    start = time.perf_counter()
+    stats = asyncio.run(run())
+    return stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='existing library to run against instead of generating one')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--threads', type=int, default=8, help='server threads (sync) and service threads (async)')
+    parser.add_argument('--concurrency', default='8,64,256', help='comma-separated open connection counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per stack and concurrency level')
+    parser.add_argument('--client-delay', type=float, default=20.0, help='milliseconds each body write takes')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"endpoint weights; endpoints: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--stacks', default='sync,async')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    stacks = args.stacks.split(',')
+    tokens = mint_tokens(DEFAULT_SECRET_KEY)
+    client_delay = args.client_delay / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if not database:
+            database = os.path.join(tmp, 'library.db')
+            print(f"generating {args.scale} library ...", file=sys.stderr)
+            generate_library(database, seed=args.seed, **SCALES[args.scale])
+        mix = RequestMix(parse_mix(args.mix), tokens, library_ids(database, args.scale))
+        # main and the service thread pool read their settings when they are imported
+        os.environ['DATABASE_PATH'] = database
+        os.environ['SECRET_KEY'] = DEFAULT_SECRET_KEY
+        os.environ['SERVICE_WORKERS'] = str(args.threads)
+        from asgi import app as asgi_app
+        from main import app as wsgi_app
+        logging.getLogger().setLevel(logging.WARNING)
+
+        results = []
+        header = f"{'stack':6} {'connections':>11} {'requests':>9} {'req/s':>9} {'errors':>7} " \
+                 f"{'p50':>9} {'p99':>9} {'max':>9}"
+        print(header + "\n" + '-' * len(header))
+        for concurrency in levels:
+            for stack in stacks:
+                if stack == 'sync':
+                    stats, elapsed = run_sync(wsgi_app, mix, concurrency, args.threads, args.duration, client_delay,
+                                              args.seed)
+                else:
+                    stats, elapsed = run_async(asgi_app, mix, concurrency, args.duration, client_delay, args.seed)
+                histogram = stats.histogram
+                print(f"{stack:6} {concurrency:11d} {histogram.total:9d} {histogram.total / elapsed:9.1f} "
+                      f"{stats.errors:7d} {histogram.percentile(50) / 1000:9.2f} "
+                      f"{histogram.percentile(99) / 1000:9.2f} {histogram.max / 1000:9.2f}")
+                results.append({
+                    "stack": stack, "connections": concurrency, "requests": histogram.total,
+                    "requests_per_sec": round(histogram.total / elapsed, 2), "errors": stats.errors,
+                    "latency_ms": {f"p{q}": round(histogram.percentile(q) / 1000, 3) for q in (50, 99)},
+                    "max_ms": round(histogram.max / 1000, 3),
+                })
+    print(f"\nlatencies in ms; {args.threads} threads, {args.client_delay:g} ms per body write")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"threads": args.threads, "client_delay_ms": args.client_delay, "results": results}, f,
+                      indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Hammer LoanService.create_loan from many threads and check copies are never oversold.
+
+    python -m benchmarks.checkout_stress --threads 16 --copies 200 --attempts 2000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from config import sqlite_config
+from config.sqlite_config import create_tables
+from services.loan_service import LoanService
+
+
+def add_book(database, copies, isbn):
+    conn = sqlite3.connect(database)
+    cursor = conn.execute("INSERT INTO Books (title, author, published_date, isbn, number_of_pages, cover_image, "
+                          "language, available_copies) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                          (f"Stress {isbn}", "Benchmark", "2020-01-01", isbn, 100, None, "English", copies))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+
+def run_checkouts(book_ids, threads, attempts):
+    """Spread ``attempts`` checkouts over ``threads`` threads; returns (created, refused, errors, seconds)."""
+    results = {"created": 0, "refused": 0, "errors": 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(index):
+        created = refused = errors = 0
+        start_barrier.wait()
+        for attempt in range(index, attempts, threads):
+            data = {"book_id": book_ids[attempt % len(book_ids)], "member_id": index, "loan_date": "2024-01-01"}
+            try:
+                _, status = LoanService.create_loan(data)
+            except sqlite3.Error:
+                errors += 1
+                continue
+            if status == 201:
+                created += 1
+            else:
+                refused += 1
+        with lock:
+            results["created"] += created
+            results["refused"] += refused
+            results["errors"] += errors
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results["created"], results["refused"], results["errors"], time.perf_counter() - start
+
+
+def check_book(database, book_id):
+    conn = sqlite3.connect(database)
+    available = conn.execute("SELECT available_copies FROM Books WHERE id = ?", (book_id,)).fetchone()[0]
+    loans = conn.execute("SELECT COUNT(*) FROM Loan WHERE book_id = ?", (book_id,)).fetchone()[0]
+    conn.close()
+    return available, loans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--copies', type=int, default=200, help='copies of the contended title')
+    parser.add_argument('--attempts', type=int, default=2000, help='checkouts attempted per scenario')
+    parser.add_argument('--titles', type=int, default=50, help='titles in the uncontended throughput scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'checkout.db')
+        create_tables(database)
+        sqlite_config.configure_pool(database)
+        failed = False
+
+        # One popular title with fewer copies than checkout attempts: every copy must go exactly once
+        book_id = add_book(database, args.copies, 'hot')
+        created, refused, errors, seconds = run_checkouts([book_id], args.threads, args.attempts)
+        available, loans = check_book(database, book_id)
+        print(f"hot title:  {created} created, {refused} refused, {errors} errors in {seconds:.2f}s "
+              f"({args.attempts / seconds:,.0f} checkouts/s)")
+        print(f"            available_copies={available}, loans={loans}, copies={args.copies}")
+        if available < 0 or loans != created or available + loans != args.copies:
+            print("FAIL: copies were oversold or lost")
+            failed = True
+
+        # Many titles with plenty of copies: measures checkout throughput under write contention
+        book_ids = [add_book(database, args.attempts, f'spread-{index}') for index in range(args.titles)]
+        created, refused, errors, seconds = run_checkouts(book_ids, args.threads, args.attempts)
+        print(f"{args.titles} titles: {created} created, {refused} refused, {errors} errors in {seconds:.2f}s "
+              f"({created / seconds:,.0f} checkouts/s)")
+        if created != args.attempts:
+            failed = True
+
+        print(f"pool: {sqlite_config.get_pool_stats()}")
+        sqlite_config.pool.close()
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
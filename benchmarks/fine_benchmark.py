@@ -0,0 +1,88 @@
+"""Compare computing overdue fines per row in Python with computing them in the loan query.
+
+    python -m benchmarks.fine_benchmark --loans 200000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from config.sqlite_config import create_tables
+from dao.loan_dao_queries import LoanDaoQueries
+from services.loan_service import LoanService
+
+
+def populate(database, loans, seed=42):
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    rows = []
+    for _ in range(loans):
+        loan_date = start + timedelta(days=rng.randrange(1500))
+        return_date = loan_date + timedelta(days=15)
+        actual_return_date = None
+        if rng.random() < 0.8:
+            actual_return_date = (loan_date + timedelta(days=rng.randrange(40))).strftime('%Y-%m-%d')
+        rows.append((rng.randrange(1, 10000), rng.randrange(1, 2000), loan_date.strftime('%Y-%m-%d'),
+                     return_date.strftime('%Y-%m-%d'), actual_return_date))
+    conn = sqlite3.connect(database)
+    conn.executemany("INSERT INTO Loan (book_id, member_id, loan_date, return_date, actual_return_date) "
+                     "VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def python_fines(conn):
+    """The previous path: SELECT * and calculate_fine (two strptime calls) for every row."""
+    loans = []
+    for loan in conn.execute(LoanDaoQueries.get_all_loans()):
+        loan_dict = dict(loan)
+        loan_dict['fine'] = LoanService.calculate_fine(loan_dict['return_date'], loan_dict.get('actual_return_date'))
+        loans.append(loan_dict)
+    return loans
+
+
+def sql_fines(conn):
+    return [dict(loan) for loan in conn.execute(LoanDaoQueries.get_all_loans_with_fine(), (LoanService.FINE_RATE,))]
+
+
+def best_of(fn, conn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(conn)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loans', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'fines.db')
+        create_tables(database)
+        populate(database, args.loans)
+
+        conn = sqlite3.connect(database)
+        conn.row_factory = sqlite3.Row
+        python_time, python_result = best_of(python_fines, conn, args.repeat)
+        sql_time, sql_result = best_of(sql_fines, conn, args.repeat)
+        conn.close()
+
+    if [loan['fine'] for loan in python_result] != [loan['fine'] for loan in sql_result]:
+        raise SystemExit("SQL fines differ from calculate_fine")
+
+    print(f"loans: {args.loans}, best of {args.repeat}")
+    print(f"python per-row fines: {python_time * 1000:9.1f} ms  ({args.loans / python_time:12,.0f} rows/s)")
+    print(f"sql fines:            {sql_time * 1000:9.1f} ms  ({args.loans / sql_time:12,.0f} rows/s)")
+    print(f"speedup:              {python_time / sql_time:9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
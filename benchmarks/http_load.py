@@ -0,0 +1,375 @@
+"""Drive a weighted mix of API requests through the full Flask stack and report latency per endpoint.
+
+    python -m benchmarks.http_load --scale small --concurrency 8 --duration 20
+    python -m benchmarks.http_load --url http://127.0.0.1:9090 --database /tmp/library.db --requests 50000
+
+In-process runs (the default) generate a synthetic library, import ``main`` against it and send
+requests through the WSGI test client, one client per thread. With --url the same mix is sent
+over HTTP to a running server; tokens are minted with SECRET_KEY, which must match the server's.
+Latencies go into log-linear (HDR-style) histograms, so percentiles stay within about 1.6%
+however long the run.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from benchmarks.synthetic import DEFAULT_SEED, SCALES, generate_library
+from constants.app_constants import Roles
+
+DEFAULT_SECRET_KEY = 'my_precious'
+SEARCH_TERMS = ('river', 'shadow', 'iron storm')
+
+# name -> (role, weight, method, request builder). Builders take (rng, ids) and return (path, json body or None)
+ENDPOINTS = {
+    'get_book': (Roles.STUDENT, 30, 'GET', lambda rng, ids: (f"/api/books/{rng.randint(1, ids['books'])}", None)),
+    'list_books': (Roles.STUDENT, 15, 'GET', lambda rng, ids: ("/api/books?limit=20", None)),
+    'search_books': (Roles.STUDENT, 10, 'GET',
+                     lambda rng, ids: ("/api/books?" + urlencode({'search': rng.choice(SEARCH_TERMS)}), None)),
+    'list_books_by_author': (Roles.STUDENT, 5, 'GET',
+                             lambda rng, ids: ("/api/books?" + urlencode({'author': rng.choice(ids['authors'])}), None)),
+    'get_member': (Roles.ADMIN, 10, 'GET',
+                   lambda rng, ids: (f"/api/members/{rng.randint(1, ids['members'])}", None)),
+    'get_loan': (Roles.STUDENT, 10, 'GET', lambda rng, ids: (f"/api/loans/{rng.randint(1, ids['loans'])}", None)),
+    'list_member_loans': (Roles.STUDENT, 10, 'GET',
+                          lambda rng, ids: (f"/api/loans?member_id={rng.randint(1, ids['members'])}", None)),
+    'list_overdue_loans': (Roles.ADMIN, 3, 'GET', lambda rng, ids: ("/api/loans?status=overdue&limit=20", None)),
+    'create_loan': (Roles.ADMIN, 4, 'POST',
+                    lambda rng, ids: ("/api/loans", {"book_id": rng.randint(1, ids['books']),
+                                                     "member_id": rng.randint(1, ids['members']),
+                                                     "loan_date": "2024-06-01"})),
+    'create_book': (Roles.ADMIN, 2, 'POST',
+                    lambda rng, ids: ("/api/books", {"title": "Load Test", "author": "Load Test",
+                                                     "published_date": "2020-01-01",
+                                                     "isbn": f"load-{ids['run']}-{rng.getrandbits(64):x}", "number_of_pages": 100,
+                                                     "cover_image": None, "language": "English",
+                                                     "available_copies": 3})),
+    'update_member': (Roles.ADMIN, 1, 'PUT',
+                      lambda rng, ids: (f"/api/members/{rng.randint(1, ids['members'])}",
+                                        {"name": "Load Test", "email": "load@example.org",
+                                         "join_date": "2024-01-01"})),
+    'list_members': (Roles.ADMIN, 0, 'GET', lambda rng, ids: ("/api/members", None)),
+    'protected': (Roles.STUDENT, 0, 'GET', lambda rng, ids: ("/auth/protected", None)),
+}
+
+PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99)
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+
+class LatencyHistogram:
+    """Log-linear histogram of microsecond latencies in the style of HdrHistogram.
+
+    Values below 128 us are counted exactly; above that every power-of-two range is split
+    into 64 linear sub-buckets, which bounds the relative error of any reported value by 1/64.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1000000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, q):
+        """Highest value equivalent to the ``q``-th percentile, in microseconds."""
+        if not self.total:
+            return 0
+        rank = max(1, round(q / 100 * self.total + 0.5 - 1e-9))
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def spectrum(self, ticks_per_half=5):
+        """Yield ``(value_us, percentile, count at or below)`` rows like an .hgrm file.
+
+        Each half of the remaining distance to 100% gets ``ticks_per_half`` rows, so the tail
+        is reported in increasing detail: 0-50 in steps of 10, 50-75 in steps of 5, and so on.
+        """
+        q = 0.0
+        half_end = 50.0
+        step = half_end / ticks_per_half
+        while 100 - q > 0.001:
+            value = self.percentile(q) if q else (self.min or 0)
+            yield value, q, self._count_at_or_below(value)
+            q += step
+            if q >= half_end - 1e-9:
+                q = half_end
+                step = (100 - half_end) / 2 / ticks_per_half
+                half_end += (100 - half_end) / 2
+        yield self.max, 100.0, self.total
+
+    def _count_at_or_below(self, value):
+        return sum(count for index, count in self.counts.items() if self._highest_equivalent(index) <= value)
+
+    @staticmethod
+    def _index(value):
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + ((value >> shift) - HALF_SUB_BUCKETS)
+
+    @staticmethod
+    def _highest_equivalent(index):
+        if index < SUB_BUCKETS:
+            return index
+        shift, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+        shift += 1
+        return ((offset + HALF_SUB_BUCKETS + 1) << shift) - 1
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses = {}
+
+    def record(self, seconds, status):
+        self.histogram.record(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+    @property
+    def errors(self):
+        # Business refusals (4xx) are part of the mix; only server and transport failures count
+        return sum(count for status, count in self.statuses.items() if status >= 500)
+
+
+class InProcessTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpTransport:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    def send(self, method, path, headers, body):
+        headers = dict(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Drop the connection; the next request opens a new one
+            self.connection.close()
+            return 599
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status
+
+
+def parse_mix(text):
+    """Parse ``name=weight,name=weight``; endpoints that are not named keep weight 0."""
+    weights = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r}, expected one of: {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def mint_tokens(secret_key):
+    """Access tokens for an ADMIN and a STUDENT, minted the same way /auth/login does."""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = secret_key
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
+    JWTManager(app)
+    with app.app_context():
+        return {role: create_access_token(identity=f"load-{role.lower()}@example.org", additional_claims={"role": role})
+                for role in (Roles.ADMIN, Roles.STUDENT)}
+
+
+def library_ids(database, scale):
+    if not database:
+        sizes = SCALES[scale]
+        return {'books': sizes['books'], 'members': sizes['members'], 'loans': sizes['loans'],
+                'authors': ['Benchmark Author']}
+    connection = sqlite3.connect(database)
+    try:
+        ids = {name: connection.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 1
+               for name, table in (('books', 'Books'), ('members', 'Members'), ('loans', 'Loan'))}
+        ids['authors'] = [row[0] for row in connection.execute("SELECT author FROM Books LIMIT 200")] or ['nobody']
+    finally:
+        connection.close()
+    return ids
+
+
+def run_load(make_transport, weights, tokens, ids, concurrency, duration, requests, seed):
+    # Keeps rows created by this run distinct from earlier runs with the same seed
+    ids = dict(ids, run=f"{time.time_ns():x}")
+    names = [name for name, weight in weights.items() if weight > 0]
+    cumulative = list(itertools.accumulate(weights[name] for name in names))
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = itertools.count()
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        transport = make_transport()
+        stats = {name: EndpointStats() for name in names}
+        headers = {role: {'Authorization': f"Bearer {token}"} for role, token in tokens.items()}
+        barrier.wait()
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if requests is not None and next(remaining) >= requests:
+                break
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            role, _, method, build = ENDPOINTS[name]
+            path, body = build(rng, ids)
+            start = time.perf_counter()
+            status = transport.send(method, path, headers[role], body)
+            stats[name].record(time.perf_counter() - start, status)
+        with lock:
+            results.append(stats)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {name: EndpointStats() for name in names}
+    for stats in results:
+        for name, endpoint_stats in stats.items():
+            merged[name].merge(endpoint_stats)
+    return merged, elapsed
+
+
+def report(merged, elapsed, spectrum):
+    overall = EndpointStats()
+    for stats in merged.values():
+        overall.merge(stats)
+    header = f"{'endpoint':22} {'requests':>9} {'req/s':>9} {'errors':>7}" + ''.join(
+        f" {'p' + format(q, 'g'):>9}" for q in PERCENTILES) + f" {'max':>9}"
+    print(header + "\n" + '-' * len(header))
+    for name, stats in sorted(merged.items()) + [('all', overall)]:
+        histogram = stats.histogram
+        print(f"{name:22} {histogram.total:9d} {histogram.total / elapsed:9.1f} {stats.errors:7d}" + ''.join(
+            f" {histogram.percentile(q) / 1000:9.2f}" for q in PERCENTILES) + f" {histogram.max / 1000:9.2f}")
+    print(f"\nlatencies in ms; {overall.histogram.total} requests in {elapsed:.1f} s "
+          f"({overall.histogram.total / elapsed:.1f} req/s); statuses {dict(sorted(overall.statuses.items()))}")
+    if spectrum:
+        print(f"\n{'Value(ms)':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>18}")
+        for value, q, count in overall.histogram.spectrum():
+            inverse = f"{1 / (1 - q / 100):18.2f}" if q < 100 else f"{'inf':>18}"
+            print(f"{value / 1000:12.3f} {q / 100:14.12f} {count:10d} {inverse}")
+
+
+def to_json(merged, elapsed):
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "endpoints": {
+            name: {
+                "requests": stats.histogram.total,
+                "requests_per_sec": round(stats.histogram.total / elapsed, 2),
+                "statuses": {str(status): count for status, count in sorted(stats.statuses.items())},
+                "latency_ms": {f"p{q:g}": round(stats.histogram.percentile(q) / 1000, 3) for q in PERCENTILES},
+                "max_ms": round(stats.histogram.max / 1000, 3),
+            }
+            for name, stats in sorted(merged.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='send requests to this server instead of running the app in-process')
+    parser.add_argument('--database', help='library to run against in-process, or to read id ranges from with --url')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run (ignored with --requests)')
+    parser.add_argument('--requests', type=int, help='stop after this many requests in total')
+    parser.add_argument('--mix', help='endpoint weights, e.g. get_book=50,list_books=30,create_loan=5; '
+                                      f"endpoints: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--secret-key', default=os.environ.get('SECRET_KEY', DEFAULT_SECRET_KEY))
+    parser.add_argument('--spectrum', action='store_true', help='print the overall percentile spectrum')
+    parser.add_argument('--output', help='write per-endpoint results to this JSON file')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix) if args.mix else {name: spec[1] for name, spec in ENDPOINTS.items()}
+    tokens = mint_tokens(args.secret_key)
+    duration = None if args.requests else args.duration
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            ids = library_ids(args.database, args.scale)
+            merged, elapsed = run_load(lambda: HttpTransport(args.url), weights, tokens, ids, args.concurrency,
+                                       duration, args.requests, args.seed)
+        else:
+            database = args.database
+            if not database:
+                database = os.path.join(tmp, 'library.db')
+                print(f"generating {args.scale} library ...", file=sys.stderr)
+                generate_library(database, seed=args.seed, **SCALES[args.scale])
+            ids = library_ids(database, args.scale)
+            # main reads its settings and migrates the database when it is imported
+            os.environ['DATABASE_PATH'] = database
+            os.environ['SECRET_KEY'] = args.secret_key
+            from main import app
+            logging.getLogger().setLevel(logging.WARNING)
+            merged, elapsed = run_load(lambda: InProcessTransport(app), weights, tokens, ids, args.concurrency,
+                                       duration, args.requests, args.seed)
+
+    report(merged, elapsed, args.spectrum)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(to_json(merged, elapsed), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
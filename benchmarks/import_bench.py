@@ -0,0 +1,105 @@
+"""Measure how long ``import main`` takes in a fresh interpreter, so cold-start regressions get caught.
+
+    python -m benchmarks.import_bench --runs 10 --output benchmarks/results/import.json
+    python -m benchmarks.import_bench --compare benchmarks/results/import.json
+    python -m benchmarks.import_bench --env SWAGGER_ENABLED=0
+
+Every run starts a new Python process against an already migrated throwaway database, times
+the import and reports peak RSS. One extra run with ``-X importtime`` lists the modules that
+cost the most. --compare exits non-zero when the median import time grew by more than --threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REGRESSION_THRESHOLD = 0.10
+TOP_MODULES = 15
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(sys.modules))
+"""
+
+
+def measure(runs, environ):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], env=environ, check=True, capture_output=True,
+                                text=True).stdout.split()
+        samples.append((float(output[0]), int(output[1]), int(output[2])))
+    return samples
+
+
+def slowest_modules(environ, count):
+    """Modules with the highest cumulative import time, from ``python -X importtime``."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], env=environ, check=True,
+                            capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        modules.append((int(cumulative_us), int(self_us), name))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the measured processes, e.g. SWAGGER_ENABLED=0')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='fractional median slowdown that counts as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        environ = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'library.db'))
+        environ.update(item.split('=', 1) for item in args.env)
+        environ['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), environ.get('PYTHONPATH')]))
+        # The first import creates and migrates the database; keep that out of the samples
+        measure(1, environ)
+        samples = measure(args.runs, environ)
+        modules = slowest_modules(environ, TOP_MODULES)
+
+    seconds = sorted(sample[0] for sample in samples)
+    result = {
+        "runs": args.runs,
+        "env": dict(item.split('=', 1) for item in args.env),
+        "median_ms": round(statistics.median(seconds) * 1000, 2),
+        "min_ms": round(seconds[0] * 1000, 2),
+        "max_ms": round(seconds[-1] * 1000, 2),
+        "max_rss_kib": max(sample[1] for sample in samples),
+        "modules_loaded": samples[-1][2],
+    }
+    print(f"import main: median {result['median_ms']:.1f} ms (min {result['min_ms']:.1f}, "
+          f"max {result['max_ms']:.1f}) over {args.runs} runs; peak RSS {result['max_rss_kib'] / 1024:.1f} MiB; "
+          f"{result['modules_loaded']} modules")
+    print(f"\n{'cumulative ms':>13} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in modules:
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:9.1f}  {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        change = (result['median_ms'] - baseline['median_ms']) / baseline['median_ms']
+        print(f"\nmedian {baseline['median_ms']:.1f} ms -> {result['median_ms']:.1f} ms ({change:+.1%})")
+        if change > args.threshold:
+            print(f"REGRESSION: import time grew by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Time every public BookService, MemberService, LoanService and AuthService method.
+
+    python -m benchmarks.service_bench --scale small --output benchmarks/results/baseline.json
+    python -m benchmarks.service_bench --scale small --compare benchmarks/results/baseline.json
+
+Without --database a synthetic library is generated into a temporary directory; an existing
+database can be reused with --database, but write cases add, change and delete rows in it.
+Results are written as sorted, indented JSON so two runs can also be compared with a plain diff.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+from benchmarks.synthetic import BENCHMARK_PASSWORD, DEFAULT_SEED, FIRST_NAMES, SCALES, generate_library
+from config import sqlite_config
+from services.auth_service import AuthService
+from services.book_service import BookService
+from services.cache import CACHES
+from services.loan_service import LoanService
+from services.member_service import MemberService
+
+SERVICES = (BookService, MemberService, LoanService, AuthService)
+SEARCH_WORDS = ('river', 'shadow garden', 'win', 'iron storm', 'light')
+REGRESSION_THRESHOLD = 0.10
+
+# Cases that read whole tables or hash passwords run this many times fewer iterations
+HEAVY = 20
+
+
+class Case:
+    def __init__(self, name, run, heavy=False):
+        self.name = name
+        self.run = run
+        self.heavy = heavy
+
+    @property
+    def method(self):
+        return self.name.split('[')[0]
+
+
+def build_cases(connection, rng, run_id):
+    """Return the benchmark cases in execution order; creates run before the updates and deletes that use their rows."""
+    books = connection.execute("SELECT MAX(id) FROM Books").fetchone()[0]
+    members = connection.execute("SELECT MAX(id) FROM Members").fetchone()[0]
+    loans = connection.execute("SELECT MAX(id) FROM Loan").fetchone()[0]
+    authors = [row[0] for row in connection.execute(
+        "SELECT author FROM Books WHERE id IN (%s)" % ','.join(str(rng.randint(1, books)) for _ in range(50)))]
+    emails = [row[0] for row in connection.execute(
+        "SELECT email FROM Members WHERE id IN (%s)" % ','.join(str(rng.randint(1, members)) for _ in range(50)))]
+    user = connection.execute("SELECT email FROM Users WHERE role = 'STUDENT' LIMIT 1").fetchone()[0]
+    created_books = []
+    created_loans = []
+    registered = []
+
+    def book_id():
+        return rng.randint(1, books)
+
+    def member_id():
+        return rng.randint(1, members)
+
+    def loan_id():
+        return rng.randint(1, loans)
+
+    def new_book(i, prefix):
+        return {"title": f"Benchmark Book {i}", "author": "Benchmark Author", "published_date": "2020-01-01",
+                "isbn": f"{prefix}-{run_id}-{i}", "number_of_pages": 200, "cover_image": None,
+                "language": "English", "available_copies": 3}
+
+    def create_book(i):
+        created_books.append(BookService.create_book(new_book(i, 'bench'))["book_id"])
+
+    def update_book(i):
+        book = BookService.get_book(book_id())
+        if book:
+            BookService.update_book(book['id'], book)
+
+    def delete_book(i):
+        BookService.delete_book(created_books.pop() if created_books else books + 1)
+
+    def import_books(i):
+        BookService.import_books(new_book(f"{i}-{row}", 'import') for row in range(100))
+
+    def update_member(i):
+        member = MemberService.get_member_by_id(member_id())
+        if member:
+            MemberService.update_member(member['id'], member)
+
+    def delete_member(i):
+        MemberService.delete_member(registered.pop() if registered else members + 1)
+
+    def create_loan(i):
+        response, status = LoanService.create_loan({"book_id": book_id(), "member_id": member_id(),
+                                                    "loan_date": "2024-06-01"})
+        if status == 201:
+            created_loans.append(response["loan_id"])
+
+    def update_loan(i):
+        LoanService.update_loan(created_loans[i % len(created_loans)] if created_loans else loan_id(),
+                                {"actual_return_date": "2024-06-20"})
+
+    def delete_loan(i):
+        LoanService.delete_loan(created_loans.pop() if created_loans else loans + 1)
+
+    def register(i):
+        AuthService.register("Benchmark Member", f"bench-{run_id}-{i}@example.org", BENCHMARK_PASSWORD,
+                             "2024-01-01", "STUDENT", "benchmark")
+        registered.append(connection.execute("SELECT MAX(id) FROM Members").fetchone()[0])
+
+    return [
+        Case('BookService.build_search_expression', lambda i: BookService.build_search_expression('shadow garden')),
+        Case('BookService.get_book', lambda i: BookService.get_book(book_id())),
+        Case('BookService.get_book_versioned', lambda i: BookService.get_book_versioned(book_id())),
+        Case('BookService.get_books[first page]', lambda i: BookService.get_books()),
+        Case('BookService.get_books[author]', lambda i: BookService.get_books(author=rng.choice(authors))),
+        Case('BookService.get_books[published range]',
+             lambda i: BookService.get_books(published_start='1990-01-01', published_end='1999-12-31')),
+        Case('BookService.get_books[search]', lambda i: BookService.get_books(search=rng.choice(SEARCH_WORDS))),
+        Case('BookService.get_books[sort title, count none]',
+             lambda i: BookService.get_books(sort='title', count='none')),
+        Case('BookService.stream_books[1000 rows]', lambda i: sum(1 for _ in BookService.stream_books(limit=1000))),
+        Case('BookService.create_book', create_book),
+        Case('BookService.update_book', update_book),
+        Case('BookService.delete_book', delete_book),
+        Case('BookService.import_books[100 rows]', import_books, heavy=True),
+        Case('MemberService.get_member_by_id', lambda i: MemberService.get_member_by_id(member_id())),
+        Case('MemberService.get_member_versioned', lambda i: MemberService.get_member_versioned(member_id())),
+        Case('MemberService.get_members[first page]', lambda i: MemberService.get_members()),
+        Case('MemberService.get_members[name prefix]',
+             lambda i: MemberService.get_members(name=rng.choice(FIRST_NAMES)[:2].lower())),
+        Case('MemberService.get_members[email]', lambda i: MemberService.get_members(email=rng.choice(emails))),
+        Case('MemberService.stream_members', lambda i: sum(1 for _ in MemberService.stream_members()), heavy=True),
+        Case('MemberService.update_member', update_member),
+        Case('LoanService.calculate_fine', lambda i: LoanService.calculate_fine('2024-01-15', '2024-02-01')),
+        Case('LoanService.get_loan', lambda i: LoanService.get_loan(loan_id())),
+        Case('LoanService.get_loan_versioned', lambda i: LoanService.get_loan_versioned(loan_id())),
+        Case('LoanService.get_loans[first page]', lambda i: LoanService.get_loans()),
+        Case('LoanService.get_loans[member]', lambda i: LoanService.get_loans(member_id=member_id())),
+        Case('LoanService.get_loans[book]', lambda i: LoanService.get_loans(book_id=book_id())),
+        Case('LoanService.get_loans[active]', lambda i: LoanService.get_loans(status='active')),
+        Case('LoanService.get_loans[overdue]', lambda i: LoanService.get_loans(status='overdue')),
+        Case('LoanService.stream_loans[1000 rows]', lambda i: sum(1 for _ in LoanService.stream_loans(limit=1000))),
+        Case('LoanService.create_loan', create_loan),
+        Case('LoanService.update_loan', update_loan),
+        Case('LoanService.delete_loan', delete_loan),
+        Case('AuthService.register', register, heavy=True),
+        Case('AuthService.login', lambda i: AuthService.login(user, BENCHMARK_PASSWORD), heavy=True),
+        Case('AuthService.refresh', lambda i: AuthService.refresh(user)),
+        Case('AuthService.get_stats', lambda i: AuthService.get_stats()),
+        # Deletes the members created by register, so it runs the same number of iterations
+        Case('MemberService.delete_member', delete_member, heavy=True),
+    ]
+
+
+def uncovered_methods(cases):
+    covered = {case.method for case in cases}
+    return sorted(f"{service.__name__}.{name}" for service in SERVICES
+                  for name, _ in inspect.getmembers(service, inspect.isfunction)
+                  if not name.startswith('_') and f"{service.__name__}.{name}" not in covered)
+
+
+def run_case(case, iterations, warmup):
+    for i in range(warmup):
+        case.run(-1 - i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        case.run(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(q):
+        # Nearest rank, so every reported value is a latency that was actually observed
+        return ordered[max(0, min(len(ordered) - 1, round(q * len(ordered) + 0.5) - 1))]
+
+    return {
+        "iterations": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 4),
+        "p50_ms": round(percentile(0.50) * 1000, 4),
+        "p95_ms": round(percentile(0.95) * 1000, 4),
+        "p99_ms": round(percentile(0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(ordered) / total, 2) if total else None,
+    }
+
+
+def environment(sizes, args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "sizes": sizes,
+        "seed": args.seed,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change against ``baseline`` per case and return the names of cases whose p50 regressed."""
+    regressions = []
+    print(f"\n{'case':52} {'p50 before':>11} {'p50 after':>11} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:52} {'-':>11} {result['p50_ms']:11.3f} {'new':>8}")
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] if before['p50_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:52} {before['p50_ms']:11.3f} {result['p50_ms']:11.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='reuse this library instead of generating one')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='run only cases whose name contains this text')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='p50 slowdown reported as a regression (default 0.10 = 10%%)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if not database:
+            database = os.path.join(tmp, 'library.db')
+            print(f"generating {args.scale} library ...", file=sys.stderr)
+            generate_library(database, seed=args.seed, **SCALES[args.scale])
+        sqlite_config.configure_pool(database)
+        for cache in CACHES.values():
+            cache.clear()
+
+        app = Flask(__name__)
+        app.config['SECRET_KEY'] = 'benchmark-only-secret-key-do-not-deploy'
+        JWTManager(app)
+        connection = sqlite3.connect(database)
+        sizes = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                 for table in ('Books', 'Members', 'Loan')}
+        try:
+            with app.test_request_context('/'):
+                cases = build_cases(connection, random.Random(args.seed), int(time.time()))
+                for name in uncovered_methods(cases):
+                    print(f"warning: {name} has no benchmark case", file=sys.stderr)
+                results = {}
+                for case in cases:
+                    if args.only and args.only not in case.name:
+                        continue
+                    iterations = max(3, args.iterations // HEAVY) if case.heavy else args.iterations
+                    warmup = min(args.warmup, 1) if case.heavy else args.warmup
+                    result = results[case.name] = run_case(case, iterations, warmup)
+                    print(f"{case.name:52} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+                          f"p99 {result['p99_ms']:9.3f} ms  {result['ops_per_sec'] or 0:10.1f} ops/s")
+        finally:
+            connection.close()
+            sqlite_config.configure_pool()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"environment": environment(sizes, args), "results": results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
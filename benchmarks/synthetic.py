@@ -0,0 +1,145 @@
+"""Generate a reproducible synthetic library database for benchmarks.
+
+    python -m benchmarks.synthetic /tmp/library.db --scale medium
+    python -m benchmarks.synthetic /tmp/library.db --books 1000000 --members 200000 --loans 10000000
+
+The same scale and seed always produce the same rows. Rows are bulk-loaded into the bare
+tables first and the remaining migrations (search index, secondary indexes) run afterwards,
+which is much faster than maintaining every index row by row.
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from config.migrations import migrate
+
+SCALES = {
+    'small': {'books': 10000, 'members': 2000, 'loans': 100000},
+    'medium': {'books': 100000, 'members': 20000, 'loans': 1000000},
+    'large': {'books': 1000000, 'members': 200000, 'loans': 10000000},
+}
+DEFAULT_SEED = 42
+DEFAULT_USERS = 100
+BATCH_SIZE = 50000
+
+# Every generated user logs in with this password; user 1 is an ADMIN, the rest are STUDENTs
+BENCHMARK_PASSWORD = 'benchmark'
+
+FIRST_DATE = date(2018, 1, 1)
+DAYS = 7 * 365
+LOAN_DAYS = 15
+RETURNED_SHARE = 0.85
+
+WORDS = ('river', 'shadow', 'garden', 'winter', 'silent', 'empire', 'glass', 'ocean', 'forgotten', 'iron',
+         'summer', 'crimson', 'city', 'night', 'stone', 'secret', 'northern', 'light', 'house', 'storm',
+         'broken', 'golden', 'paper', 'wolf', 'distant', 'song', 'machine', 'orchard', 'harbor', 'memory')
+FIRST_NAMES = ('Ada', 'Ravi', 'Mei', 'Lucas', 'Amara', 'Noah', 'Priya', 'Elena', 'Kofi', 'Sofia',
+               'Hiro', 'Layla', 'Mateo', 'Anya', 'Omar', 'Ines', 'Jonas', 'Zara', 'Tariq', 'Freya')
+LAST_NAMES = ('Okafor', 'Sharma', 'Chen', 'Silva', 'Novak', 'Haddad', 'Kowalski', 'Tanaka', 'Moreau', 'Osei',
+              'Larsen', 'Reyes', 'Ivanova', 'Mensah', 'Fischer', 'Gupta', 'Rossi', 'Nakamura', 'Adeyemi', 'Berg')
+LANGUAGES = ('English', 'English', 'English', 'Spanish', 'French', 'German', 'Hindi', 'Japanese')
+
+
+def generate_library(database, books, members, loans, users=DEFAULT_USERS, seed=DEFAULT_SEED):
+    """Create ``database`` from scratch and fill it; returns the row counts written."""
+    if os.path.exists(database):
+        raise FileExistsError(f"{database} already exists; synthetic libraries are only generated into new files")
+    users = min(users, members)
+    rng = random.Random(seed)
+    dates = [(FIRST_DATE + timedelta(days=day)).isoformat() for day in range(DAYS + LOAN_DAYS + 60)]
+
+    # Only the base tables, so rows are not indexed one at a time while loading
+    migrate(database, target=1)
+    connection = sqlite3.connect(database)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        _load(connection, "INSERT INTO Books (title, author, published_date, isbn, number_of_pages, cover_image, "
+                          "language, available_copies) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+              _books(rng, books))
+        _load(connection, "INSERT INTO Members (name, email, join_date) VALUES (?, ?, ?)",
+              _members(rng, members, dates))
+        _load(connection, "INSERT INTO Loan (book_id, member_id, loan_date, return_date, fine, actual_return_date) "
+                          "VALUES (?, ?, ?, ?, 0, ?)",
+              _loans(rng, loans, books, members, dates))
+        password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+        connection.executemany("INSERT INTO Users (member_id, email, password_hash, role) "
+                               "SELECT id, email, ?, CASE WHEN id = 1 THEN 'ADMIN' ELSE 'STUDENT' END "
+                               "FROM Members WHERE id = ?", ((password_hash, member_id) for member_id in
+                                                            range(1, users + 1)))
+        connection.commit()
+    finally:
+        connection.close()
+    migrate(database)
+    return {'books': books, 'members': members, 'loans': loans, 'users': users}
+
+
+def _load(connection, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.executemany(sql, batch)
+            batch = []
+    if batch:
+        connection.executemany(sql, batch)
+
+
+def _books(rng, count):
+    authors = max(1, count // 20)
+    for book_id in range(1, count + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title()
+        author_id = rng.randrange(authors)
+        author = f"{FIRST_NAMES[author_id % 20]} {LAST_NAMES[author_id // 20 % 20]} {author_id}"
+        published = (FIRST_DATE - timedelta(days=rng.randrange(80 * 365))).isoformat()
+        yield (title, author, published, f"978{book_id:010d}", rng.randint(80, 900),
+               None if rng.random() < 0.3 else f"http://example.com/covers/{book_id}.jpg",
+               rng.choice(LANGUAGES), rng.randint(0, 10))
+
+
+def _members(rng, count, dates):
+    for member_id in range(1, count + 1):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        yield (f"{first} {last}", f"{first.lower()}.{last.lower()}.{member_id}@example.org",
+               dates[rng.randrange(DAYS)])
+
+
+def _loans(rng, count, books, members, dates):
+    for _ in range(count):
+        # Squaring skews checkouts towards low book ids, so some books are far more popular than others
+        book_id = int(books * rng.random() ** 2) + 1
+        day = rng.randrange(DAYS)
+        actual_return_date = None
+        if rng.random() < RETURNED_SHARE:
+            actual_return_date = dates[day + rng.randrange(LOAN_DAYS + 45)]
+        yield (book_id, rng.randrange(1, members + 1), dates[day], dates[day + LOAN_DAYS], actual_return_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--books', type=int)
+    parser.add_argument('--members', type=int)
+    parser.add_argument('--loans', type=int)
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sizes = dict(SCALES[args.scale])
+    sizes.update({name: getattr(args, name) for name in sizes if getattr(args, name) is not None})
+    start = time.perf_counter()
+    counts = generate_library(args.database, users=args.users, seed=args.seed, **sizes)
+    print(f"generated {counts} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import contextvars
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+# Statements slower than this many milliseconds are logged; unset disables the slow-query log
+SLOW_QUERY_MS = float(os.environ['SLOW_QUERY_MS']) if os.environ.get('SLOW_QUERY_MS') else None
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', '').lower() in ('1', 'true', 'yes')
+# Log every statement SQLite runs, with parameters expanded, at DEBUG level. Development only
+SQL_TRACE = os.environ.get('SQL_TRACE', '').lower() in ('1', 'true', 'yes')
+
+_SLOW_QUERY_SECONDS = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS is not None else None
+# Frames from these packages are skipped when looking for the code that issued a statement
+_INFRASTRUCTURE = ('config.', 'sqlite3', '__main__')
+
+# A context variable rather than a thread-local, so the ASGI app can carry a request's stats
+# across the service threads that handle it. Under a threaded server it behaves per thread
+_scope = contextvars.ContextVar('sql_stats', default=None)
+
+
+class SqlStats:
+    """SQL work done by one thread between begin_scope() and end_scope(), typically one request."""
+    __slots__ = ('statements', 'seconds', 'rows')
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+def begin_scope():
+    stats = SqlStats()
+    _scope.set(stats)
+    return stats
+
+
+def end_scope():
+    stats = _scope.get()
+    _scope.set(None)
+    return stats
+
+
+def _record(seconds, statements=0, rows=0):
+    stats = _scope.get()
+    if stats is not None:
+        stats.statements += statements
+        stats.seconds += seconds
+        stats.rows += rows
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that adds the time spent in SQLite, statements run and rows fetched to the current scope.
+
+    SELECTs do most of their work while rows are stepped, so fetches are timed as well as execute.
+    With the slow-query log on, a statement's time is also accumulated until its rows are exhausted
+    or the cursor is reused, and checked against SLOW_QUERY_MS.
+    """
+    _sql = None
+    _parameters = None
+    _elapsed = 0.0
+    _logged = False
+
+    def execute(self, sql, parameters=()):
+        self._finish_statement()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record(elapsed, statements=1)
+            if _SLOW_QUERY_SECONDS is not None:
+                self._track(sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish_statement()
+        if _SLOW_QUERY_SECONDS is not None and not isinstance(seq_of_parameters, (list, tuple)):
+            # Materialize so the parameter shapes can still be described after execution
+            seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record(elapsed, statements=1)
+            if _SLOW_QUERY_SECONDS is not None:
+                self._track(sql, _ManyParameters(seq_of_parameters), elapsed)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        elapsed = time.perf_counter() - start
+        _record(elapsed, rows=0 if row is None else 1)
+        self._fetched(elapsed, exhausted=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        elapsed = time.perf_counter() - start
+        _record(elapsed, rows=len(rows))
+        self._fetched(elapsed, exhausted=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        elapsed = time.perf_counter() - start
+        _record(elapsed, rows=len(rows))
+        self._fetched(elapsed, exhausted=True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            elapsed = time.perf_counter() - start
+            _record(elapsed)
+            self._fetched(elapsed, exhausted=True)
+            raise
+        elapsed = time.perf_counter() - start
+        _record(elapsed, rows=1)
+        self._fetched(elapsed, exhausted=False)
+        return row
+
+    def close(self):
+        self._finish_statement()
+        super().close()
+
+    def _track(self, sql, parameters, elapsed):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = elapsed
+        self._logged = False
+        if self.description is None:
+            # Not a query, so there is nothing left to fetch
+            self._finish_statement()
+        elif elapsed >= _SLOW_QUERY_SECONDS:
+            # Callers that read a single row never exhaust the cursor, so check right away too
+            self._log_slow()
+
+    def _fetched(self, elapsed, exhausted):
+        if self._sql is None:
+            return
+        self._elapsed += elapsed
+        if exhausted:
+            self._finish_statement()
+
+    def _finish_statement(self):
+        if self._sql is None:
+            return
+        if not self._logged and self._elapsed >= _SLOW_QUERY_SECONDS:
+            self._log_slow()
+        self._sql = None
+        self._parameters = None
+
+    def _log_slow(self):
+        self._logged = True
+        message = (f"Slow query ({self._elapsed * 1000:.1f} ms) from {_caller()}: {' '.join(self._sql.split())} "
+                   f"params {describe_parameters(self._parameters)}")
+        if SLOW_QUERY_EXPLAIN and not isinstance(self._parameters, _ManyParameters):
+            message += "\n" + explain(self.connection, self._sql, self._parameters)
+        logging.warning(message)
+
+
+class _ManyParameters(list):
+    """Parameter rows of an executemany call."""
+
+
+def describe_parameters(parameters):
+    """Describe parameter types and sizes without their values, e.g. ``(int, str[12], None)``."""
+    if isinstance(parameters, _ManyParameters):
+        first = describe_parameters(parameters[0]) if parameters else '()'
+        return f"{len(parameters)} rows of {first}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{name}: {_describe_value(value)}" for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(_describe_value(value) for value in parameters) + ')'
+
+
+def _describe_value(value):
+    if value is None:
+        return 'None'
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def explain(connection, sql, parameters):
+    try:
+        # A plain cursor, so the plan lookup is not itself timed and logged
+        plan = sqlite3.Cursor(connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error as e:
+        return f"    (no query plan: {e})"
+    return '\n'.join(f"    {detail}" for *_, detail in plan)
+
+
+def _caller():
+    """Module, qualified function name and line of the first frame outside the database layer."""
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith(_INFRASTRUCTURE):
+            location = f"{module}.{_qualname(frame)}:{frame.f_lineno}"
+            if module.startswith('services.'):
+                return location
+            fallback = fallback or location
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def _qualname(frame):
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', None)
+    if qualname is not None:
+        return qualname
+    # Before Python 3.11 code objects only know their own name; take the class from self or cls if there is one
+    owner = frame.f_locals.get('self', frame.f_locals.get('cls'))
+    if owner is None:
+        return code.co_name
+    return f"{(owner if isinstance(owner, type) else type(owner)).__name__}.{code.co_name}"
+
+
+def _trace_statement(statement):
+    logging.debug(f"SQL: {statement}")
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if SQL_TRACE:
+            self.set_trace_callback(_trace_statement)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts bypass a Python-level Cursor.execute
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Connection class for the pool: plain sqlite3 connections unless instrumentation is switched on."""
+    if METRICS_ENABLED or SLOW_QUERY_MS is not None or SQL_TRACE:
+        return InstrumentedConnection
+    return sqlite3.Connection
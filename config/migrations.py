@@ -0,0 +1,90 @@
+import logging
+import os
+import re
+import sqlite3
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, 'schema', 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return ``(version, name, path)`` for every ``NNNN_name.sql`` file, ordered by version.
+
+    Versions must run 1, 2, 3, ... without gaps so a database's ``user_version`` always
+    identifies exactly which migrations it has.
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    for expected, (version, name, _) in enumerate(migrations, start=1):
+        if version != expected:
+            raise MigrationError(f"Expected migration {expected:04d}, found {version:04d}_{name}")
+    return migrations
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(database, target=None):
+    """Apply pending migrations to ``database`` in order and return the versions applied.
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction together with the bump of
+    ``PRAGMA user_version``, so a failure leaves the database at the previous version and
+    several processes starting at once apply every migration exactly once.
+    """
+    migrations = discover_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    connection = sqlite3.connect(database, isolation_level=None)
+    applied = []
+    try:
+        if schema_version(connection) > latest:
+            logging.warning(f"Database {database} is at schema version {schema_version(connection)}, "
+                            f"newer than the latest known migration {latest}")
+        for version, name, path in migrations:
+            if target is not None and version > target:
+                break
+            if version <= schema_version(connection):
+                continue
+            with open(path) as f:
+                statements = split_statements(f.read())
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have applied it while we waited for the write lock
+                if version <= schema_version(connection):
+                    connection.execute("ROLLBACK")
+                    continue
+                for statement in statements:
+                    connection.execute(statement)
+                connection.execute(f"PRAGMA user_version = {version}")
+                connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                connection.execute("ROLLBACK")
+                raise MigrationError(f"Migration {version:04d}_{name} failed: {e}") from e
+            logging.info(f"Applied migration {version:04d}_{name}")
+            applied.append(version)
+    finally:
+        connection.close()
+    return applied
+
+
+def split_statements(script):
+    """Split a SQL script into single statements, keeping trigger bodies intact."""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    if any(line.strip() and not line.strip().startswith('--') for line in buffer.splitlines()):
+        raise MigrationError(f"Incomplete SQL statement: {buffer.strip()[:80]}")
+    return statements
@@ -0,0 +1,323 @@
+import glob
+import importlib
+import inspect
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from config import sqlite_config
+from config.migrations import migrate
+
+DAO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dao')
+
+# Plan rows like "SCAN Loan" ("SCAN TABLE Loan" before SQLite 3.36); "SCAN x USING INDEX ..." and
+# virtual table scans read an index
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+# Unfiltered DAO queries are list bases the services add filters and ORDER BY to; they are planned as built
+FILTERED = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+# DAO methods that return SQL fragments, not statements. Every other DAO query must prepare
+NOT_STATEMENTS = {
+    'BookDaoQueries.select_list': 'column list spliced into SELECTs',
+    'BookDaoQueries.search_rank': 'ORDER BY expression spliced into search queries',
+}
+
+# Scenarios whose SQL reads a whole table on purpose, with the reason they are allowed to
+ALLOWED_FULL_SCANS = {
+    'books sorted by id': 'walks the rowid b-tree in id order and stops at LIMIT',
+    'stream books sorted by id': 'walks the rowid b-tree in id order, a page at a time',
+    'members sorted by id': 'walks the rowid b-tree in id order and stops at LIMIT',
+    'stream members': 'walks the rowid b-tree in id order, a page at a time',
+}
+
+SAMPLE_BOOKS = 6
+SAMPLE_PAGE = 2
+
+
+def dao_queries():
+    """Yield ``(qualified name, sql)`` for every query method of the classes in dao/*_dao_queries.py.
+
+    Optional parameters keep their defaults, ``columns`` gets every column of the class and
+    methods that take a placeholder count are called with 1.
+    """
+    for path in sorted(glob.glob(os.path.join(DAO_DIR, '*_dao_queries.py'))):
+        module = importlib.import_module(f"dao.{os.path.splitext(os.path.basename(path))[0]}")
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for method_name, method in inspect.getmembers(cls, inspect.isfunction):
+                args = [cls.COLUMNS if name == 'columns' else 1
+                        for name, parameter in inspect.signature(method).parameters.items()
+                        if parameter.default is inspect.Parameter.empty]
+                yield f"{class_name}.{method_name}", method(*args)
+
+
+class StatementRecorder:
+    """Collects ``(sql, parameters)`` for every statement run on connections from its factory()."""
+
+    def __init__(self):
+        self.statements = []
+        self._paused = False
+
+    def record(self, sql, parameters):
+        if not self._paused:
+            self.statements.append((sql, parameters))
+
+    @contextmanager
+    def paused(self):
+        """Run statements that are only there to set a scenario up, such as fetching a first page."""
+        self._paused = True
+        try:
+            yield
+        finally:
+            self._paused = False
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+    def factory(self):
+        """Connection class for the pool that records every execute."""
+        recorder = self
+
+        class RecordingConnection(sqlite3.Connection):
+            def cursor(self, factory=_RecordingCursor):
+                cursor = super().cursor(factory)
+                cursor.recorder = recorder
+                return cursor
+
+            def execute(self, sql, parameters=()):
+                return self.cursor().execute(sql, parameters)
+
+            def executemany(self, sql, seq_of_parameters):
+                return self.cursor().executemany(sql, seq_of_parameters)
+
+        return RecordingConnection
+
+
+class _RecordingCursor(sqlite3.Cursor):
+    recorder = None
+
+    def execute(self, sql, parameters=()):
+        self.recorder.record(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        if seq_of_parameters:
+            # One set of parameters is enough to plan the statement
+            self.recorder.record(sql, seq_of_parameters[0])
+        return super().executemany(sql, seq_of_parameters)
+
+
+def scenarios(recorder):
+    """Return ``(name, call)`` pairs that run the services the way the controllers do, in order.
+
+    The first ones add the sample rows the later reads and writes work on. Next-page scenarios
+    fetch their first page with ``recorder`` paused, so only the page read from a cursor counts.
+    """
+    from services.auth_service import AuthService
+    from services.book_service import BookService
+    from services.loan_service import LoanService
+    from services.member_service import MemberService
+    from services.version_service import BOOKS, LOANS, MEMBERS, VersionService
+
+    def book(number):
+        return {"title": f"Sample book {number}", "author": f"Author {number % 2}",
+                "published_date": f"2020-01-{number + 1:02d}", "isbn": f"isbn-{number}", "number_of_pages": 100,
+                "cover_image": None, "language": "English", "available_copies": 2}
+
+    def next_page(get, **filters):
+        with recorder.paused():
+            _, _, after = get(limit=SAMPLE_PAGE, **filters)
+        assert after, f"sample data has no second page for {filters}"
+        return get(limit=SAMPLE_PAGE, after=after, **filters)
+
+    def create_books():
+        for number in range(SAMPLE_BOOKS):
+            BookService.create_book(book(number))
+
+    def register_members():
+        for number in range(SAMPLE_BOOKS):
+            AuthService.register(f"Member {number}", f"member{number}@example.com", 'password', '2024-01-01',
+                                 'USER', 'plan-check')
+
+    def create_loans():
+        for number in range(1, SAMPLE_BOOKS + 1):
+            LoanService.create_loan({"book_id": number, "member_id": number, "loan_date": f"2024-01-{number:02d}"})
+
+    return [
+        ('create books', create_books),
+        ('import books', lambda: BookService.import_books([book(SAMPLE_BOOKS), book(0)])),
+        ('register members', register_members),
+        ('create loans', create_loans),
+        ('return a loan', lambda: LoanService.update_loan(1, {"actual_return_date": '2024-02-01'})),
+        ('extend a loan', lambda: LoanService.update_loan(2, {"return_date": '2024-03-01'})),
+        ('books', lambda: BookService.get_books(limit=SAMPLE_PAGE)),
+        ('books, next page', lambda: next_page(BookService.get_books)),
+        ('books sorted by title', lambda: BookService.get_books(sort='title', limit=SAMPLE_PAGE)),
+        ('books sorted by title, next page', lambda: next_page(BookService.get_books, sort='title')),
+        ('books sorted by author', lambda: BookService.get_books(sort='author', limit=SAMPLE_PAGE)),
+        ('books sorted by author, next page', lambda: next_page(BookService.get_books, sort='author')),
+        ('books sorted by id', lambda: BookService.get_books(sort='id', limit=SAMPLE_PAGE)),
+        ('books sorted by id, next page', lambda: next_page(BookService.get_books, sort='id')),
+        ('books by author', lambda: BookService.get_books(author='Author 1', limit=SAMPLE_PAGE)),
+        ('books by author, next page', lambda: next_page(BookService.get_books, author='Author 1')),
+        ('books by author sorted by title', lambda: BookService.get_books(author='Author 1', sort='title')),
+        ('books published in a range', lambda: BookService.get_books(published_start='2020-01-02',
+                                                                     published_end='2020-01-05')),
+        ('books with an estimated total', lambda: BookService.get_books(author='Author 0', count='estimate')),
+        ('books without a total', lambda: BookService.get_books(count='none')),
+        ('books with a fieldset', lambda: BookService.get_books(fields=['isbn'], sort='title', limit=SAMPLE_PAGE)),
+        ('book search', lambda: BookService.get_books(search='sample', limit=SAMPLE_PAGE)),
+        ('book search, next page', lambda: next_page(BookService.get_books, search='sample')),
+        ('book search by author', lambda: BookService.get_books(search='sample', author='Author 1')),
+        ('stream books', lambda: list(BookService.stream_books())),
+        ('stream books sorted by id', lambda: list(BookService.stream_books(sort='id'))),
+        ('stream book search', lambda: list(BookService.stream_books(search='sample'))),
+        ('book', lambda: BookService.get_book_versioned(1)),
+        ('update a book', lambda: BookService.update_book(SAMPLE_BOOKS + 1, book(SAMPLE_BOOKS + 1))),
+        ('members sorted by id', lambda: MemberService.get_members(limit=SAMPLE_PAGE)),
+        ('members sorted by id, next page', lambda: next_page(MemberService.get_members)),
+        ('members sorted by name', lambda: MemberService.get_members(sort='name', limit=SAMPLE_PAGE)),
+        ('members sorted by name, next page', lambda: next_page(MemberService.get_members, sort='name')),
+        ('member by email', lambda: MemberService.get_members(email='member1@example.com')),
+        ('members by name prefix', lambda: MemberService.get_members(name='mem', limit=SAMPLE_PAGE)),
+        ('members by name prefix, next page', lambda: next_page(MemberService.get_members, name='mem')),
+        ('stream members', lambda: list(MemberService.stream_members())),
+        ('stream members by name prefix', lambda: list(MemberService.stream_members(name='mem'))),
+        ('member', lambda: MemberService.get_member_versioned(1)),
+        ('update a member', lambda: MemberService.update_member(
+            1, {"name": 'Member one', "email": 'member1@example.com', "join_date": '2024-01-01'})),
+        ('loans', lambda: LoanService.get_loans(limit=SAMPLE_PAGE)),
+        ('loans, next page', lambda: next_page(LoanService.get_loans)),
+        ('loans of a member', lambda: LoanService.get_loans(member_id=1)),
+        ('loans of a book', lambda: LoanService.get_loans(book_id=1)),
+        ('active loans', lambda: LoanService.get_loans(status='active', limit=SAMPLE_PAGE)),
+        ('active loans, next page', lambda: next_page(LoanService.get_loans, status='active')),
+        ('returned loans', lambda: LoanService.get_loans(status='returned')),
+        ('overdue loans', lambda: LoanService.get_loans(status='overdue')),
+        ('loans in a date range', lambda: LoanService.get_loans(loan_date_from='2024-01-02',
+                                                                loan_date_to='2024-01-04')),
+        ('loans with a fieldset', lambda: LoanService.get_loans(fields=['book_id'], limit=SAMPLE_PAGE)),
+        ('stream loans', lambda: list(LoanService.stream_loans())),
+        ('stream active loans of a member', lambda: list(LoanService.stream_loans(member_id=2, status='active'))),
+        ('loan', lambda: LoanService.get_loan_versioned(1)),
+        ('table versions', lambda: VersionService.get_table_versions(BOOKS, MEMBERS, LOANS)),
+        ('delete a loan', lambda: LoanService.delete_loan(2)),
+        ('delete a member', lambda: MemberService.delete_member(SAMPLE_BOOKS)),
+        ('delete a book', lambda: BookService.delete_book(SAMPLE_BOOKS + 1)),
+    ]
+
+
+def run_scenarios(database):
+    """Run every scenario against ``database``; yield ``(name, statements, error)`` for each one.
+
+    ``statements`` is the SQL it executed and ``error`` the SQLite error it failed with, or None.
+    The caches are cleared before each scenario, so every read reaches SQLite.
+    """
+    from services.cache import CACHES
+
+    recorder = StatementRecorder()
+    previous_pool = sqlite_config.pool
+    sqlite_config.configure_pool(database, factory=recorder.factory())
+    try:
+        for name, call in scenarios(recorder):
+            for cache in CACHES.values():
+                cache.clear()
+            try:
+                call()
+                error = None
+            except sqlite3.Error as e:
+                error = e
+            yield name, recorder.take(), error
+    finally:
+        sqlite_config.pool.close()
+        sqlite_config.pool = previous_pool
+        for cache in CACHES.values():
+            cache.clear()
+
+
+def full_scans(connection, sql, parameters=None):
+    """Return the tables ``sql`` reads without an index; by default every parameter is bound to NULL.
+
+    Raises sqlite3.Error if ``sql`` does not prepare.
+    """
+    if parameters is None:
+        parameters = (None,) * sql.count('?')
+    plan = connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    return scanned_tables(detail for *_, detail in plan)
+
+
+def scanned_tables(details):
+    """Return the tables that the ``EXPLAIN QUERY PLAN`` detail strings ``details`` read in full."""
+    return [match.group(1) for detail in details for match in [FULL_SCAN.match(detail)] if match]
+
+
+def check(verbose=False):
+    """Plan every DAO query and the SQL of every service scenario; return ``(name, problem, sql)`` failures.
+
+    DAO queries must prepare, and those with a WHERE clause must use an index. Service SQL must
+    prepare and read every table through an index, unless the scenario is in ALLOWED_FULL_SCANS.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'plan_check.db')
+        migrate(database)
+        connection = sqlite3.connect(database)
+        try:
+            for name, sql in dao_queries():
+                if name in NOT_STATEMENTS:
+                    status = f"skipped: {NOT_STATEMENTS[name]}"
+                else:
+                    try:
+                        tables = full_scans(connection, sql)
+                    except sqlite3.Error as e:
+                        status = f"DOES NOT PREPARE: {e}"
+                        failures.append((name, status, sql))
+                    else:
+                        if tables and FILTERED.search(sql):
+                            status = f"FULL SCAN of {', '.join(tables)}"
+                            failures.append((name, status, sql))
+                        elif tables:
+                            status = 'ok, unfiltered base query'
+                        else:
+                            status = 'ok'
+                if verbose:
+                    print(f"{name}: {status}")
+
+            for name, statements, error in run_scenarios(database):
+                problems = [(f"fails: {error}", statements[-1][0] if statements else '')] if error else []
+                for sql, parameters in statements:
+                    try:
+                        tables = full_scans(connection, sql, parameters)
+                    except sqlite3.Error as e:
+                        problems.append((f"does not prepare: {e}", sql))
+                        continue
+                    if tables and name not in ALLOWED_FULL_SCANS:
+                        problems.append((f"full scan of {', '.join(tables)}", sql))
+                failures.extend((name, problem, sql) for problem, sql in problems)
+                if verbose:
+                    if problems:
+                        status = '; '.join(problem.upper() for problem, _ in problems)
+                    elif name in ALLOWED_FULL_SCANS:
+                        status = f"ok, full scan allowed: {ALLOWED_FULL_SCANS[name]}"
+                    else:
+                        status = 'ok'
+                    print(f"{name} ({len(statements)} statements): {status}")
+        finally:
+            connection.close()
+    return failures
+
+
+if __name__ == '__main__':
+    # python -m config.query_plan_check [-v]; exits non-zero if a query does not prepare or scans a whole table
+    failures = check(verbose='-v' in sys.argv[1:])
+    for name, problem, sql in failures:
+        print(f"{name}: {problem}\n    {sql}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print('Every query prepares and reads through an index')
@@ -1,20 +1,175 @@
 import logging
+import os
+import random
 import sqlite3
+import sys
+import time
 
+from config.connection_pool import ConnectionPool
+from config.instrumentation import connection_factory
+from config.migrations import discover_migrations, migrate, schema_version
+from dao.book_dao_queries import BookDaoQueries
 
-def create_tables():
-    connection = sqlite3.connect('database.db')
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'config/database.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+DB_CACHE_SIZE_KIB = int(os.environ.get('DB_CACHE_SIZE_KIB', 16384))
+DB_STREAM_BATCH_SIZE = int(os.environ.get('DB_STREAM_BATCH_SIZE', 500))
+DB_WRITE_ATTEMPTS = int(os.environ.get('DB_WRITE_ATTEMPTS', 5))
+DB_WRITE_RETRY_DELAY = float(os.environ.get('DB_WRITE_RETRY_DELAY', 0.01))
 
-    with open('/Users/DELL/PycharmProjects/LibraryManagementSystem/schema/schema.sql') as f:
-        connection.executescript(f.read())
-    print('Tables created successfully')
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    # Negative values are interpreted by SQLite as KiB instead of pages
+    f"PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+pool = ConnectionPool(DATABASE_PATH, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, pragmas=CONNECTION_PRAGMAS,
+                      factory=connection_factory())
+
+
+def create_tables(database=None):
+    """Bring the database schema up to date by applying any pending migrations."""
+    applied = migrate(database or DATABASE_PATH)
+    if applied:
+        logging.info(f"Database schema migrated to version {applied[-1]}")
+    else:
+        logging.info('Database schema is up to date')
+
+
+def migration_status(database=None):
+    connection = sqlite3.connect(database or DATABASE_PATH)
+    try:
+        current = schema_version(connection)
+    finally:
+        connection.close()
+    for version, name, _ in discover_migrations():
+        print(f"{version:04d}_{name}: {'applied' if version <= current else 'pending'}")
+
+
+def rebuild_search_index(database=None):
+    connection = sqlite3.connect(database or DATABASE_PATH)
+    try:
+        _rebuild_search_index(connection)
+    finally:
+        connection.close()
+    logging.info('Book search index rebuilt')
+
+
+def _rebuild_search_index(connection):
+    connection.execute(BookDaoQueries.rebuild_search_index())
+    connection.commit()
+
+
+def db_connection():
+    """Borrow a warm connection from the pool; it is returned when the block exits.
+
+    Any transaction left open by the caller is rolled back on return, so writes
+    must be committed inside the block.
+    """
+    return pool.connection()
+
+
+def write_transaction(work, attempts=DB_WRITE_ATTEMPTS):
+    """Run ``work(conn)`` inside BEGIN IMMEDIATE and commit, retrying the whole unit on SQLITE_BUSY.
+
+    Taking the write lock up front means a transaction never fails halfway through because
+    another writer got in first; ``work`` may roll back itself to abandon the transaction.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            with db_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                result = work(conn)
+                if conn.in_transaction:
+                    conn.commit()
+                return result
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == attempts:
+                raise
+            delay = DB_WRITE_RETRY_DELAY * 2 ** (attempt - 1)
+            logging.warning(f"Database busy, retrying write in {delay * 1000:.0f} ms (attempt {attempt}/{attempts})")
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+
+def is_busy_error(error):
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'database is locked' in str(error)
+
+
+def configure_pool(database=None, factory=None):
+    """Replace the shared pool, e.g. to point it at another database or after forking a worker.
+
+    ``factory`` is the connection class, by default the one instrumentation picks.
+    """
+    global pool
+    old_pool = pool
+    pool = ConnectionPool(database or DATABASE_PATH, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                          pragmas=CONNECTION_PRAGMAS, factory=factory or connection_factory())
+    old_pool.close()
+    return pool
+
+
+def stream_pages(read_page, after=None, limit=None, batch_size=DB_STREAM_BATCH_SIZE):
+    """Return an iterator over every row of a keyset-paginated query (or the first ``limit``).
+
+    ``read_page(conn, after, size)`` returns up to ``size`` rows that follow the ``after`` cursor,
+    and the cursor after its last row. Each page borrows a pooled connection only while it is
+    read, so a slow or stalled client holds no connection between pages. Pages are separate
+    reads, not one snapshot. The first page is read before returning, so bad cursors and an
+    exhausted pool surface before a streamed response starts.
+    """
+    size = batch_size if limit is None else min(batch_size, max(limit, 0))
+    rows = []
+    if size:
+        with db_connection() as conn:
+            rows, after = read_page(conn, after, size)
+    return _stream_remaining_pages(read_page, rows, after, size, limit, batch_size)
+
+
+def _stream_remaining_pages(read_page, rows, after, size, limit, batch_size):
+    remaining = limit
+    while True:
+        yield from rows
+        if len(rows) < size:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+            if remaining <= 0:
+                return
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        with db_connection() as conn:
+            rows, after = read_page(conn, after, size)
 
 
 def get_db_connection():
-    conn = sqlite3.connect('config/database.db')
+    """Open a standalone connection outside the pool; the caller must close it."""
+    conn = sqlite3.connect(DATABASE_PATH, factory=connection_factory())
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_pool_stats():
+    return pool.stats()
+
+
+COMMANDS = {
+    'create-tables': create_tables,
+    'migrate': create_tables,
+    'migration-status': migration_status,
+    'rebuild-search': rebuild_search_index,
+}
+
 if __name__ == '__main__':
-    create_tables()
+    # python -m config.sqlite_config [create-tables | migrate | migration-status | rebuild-search]
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'create-tables'
+    if command not in COMMANDS:
+        sys.exit(f"Unknown command {command!r}, expected one of: {', '.join(COMMANDS)}")
+    COMMANDS[command]()
@@ -0,0 +1,114 @@
+"""OpenAPI spec and Swagger UI, built once and served from memory.
+
+flasgger (and jsonschema, which it imports) is only loaded when SWAGGER_ENABLED is on, so
+production workers can skip it entirely. When it is on, each spec is rendered on first request
+(or taken from a file pre-rendered at build time) and the serialized bytes are served with an
+ETag from then on.
+
+    python -m controllers.api_docs build/apispec_1.json
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+from flask import Response, request
+
+SWAGGER_ENABLED = os.environ.get('SWAGGER_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Pre-rendered spec for the default apispec_1 endpoint; rendered on first request when unset or missing
+SWAGGER_SPEC_PATH = os.environ.get('SWAGGER_SPEC_PATH')
+
+DEFAULT_SPEC_ENDPOINT = 'apispec_1'
+
+_rendered = {}
+_render_lock = threading.Lock()
+
+
+def swag_from(specs):
+    """Attach an OpenAPI operation dict to a view, where flasgger looks for it when building the spec.
+
+    Unlike ``flasgger.swag_from`` this neither imports flasgger nor wraps the view in another call.
+    """
+    def decorator(function):
+        function.specs_dict = specs
+        return function
+    return decorator
+
+
+def init_api_docs(app):
+    """Register /apidocs and the spec routes; returns the flasgger Swagger object, or None when disabled."""
+    if not SWAGGER_ENABLED:
+        return None
+    from flasgger import Swagger
+
+    swagger = Swagger(app)
+    for spec in swagger.config['specs']:
+        app.view_functions[f"flasgger.{spec['endpoint']}"] = _spec_view(app, swagger, spec['endpoint'])
+    return swagger
+
+
+def render_spec(app, swagger, endpoint=DEFAULT_SPEC_ENDPOINT):
+    """Return ``(body, etag)`` for a spec, building and serializing it on the first call."""
+    rendered = _rendered.get(endpoint)
+    if rendered is not None:
+        return rendered
+    with _render_lock:
+        rendered = _rendered.get(endpoint)
+        if rendered is None:
+            body = _load_prerendered(endpoint)
+            if body is None:
+                with app.test_request_context():
+                    body = json.dumps(swagger.get_apispecs(endpoint), sort_keys=True, separators=(',', ':')).encode()
+            rendered = _rendered[endpoint] = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+    return rendered
+
+
+def _load_prerendered(endpoint):
+    if endpoint != DEFAULT_SPEC_ENDPOINT or not SWAGGER_SPEC_PATH:
+        return None
+    try:
+        with open(SWAGGER_SPEC_PATH, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        logging.warning(f"Pre-rendered spec {SWAGGER_SPEC_PATH} not found; rendering it instead")
+        return None
+
+
+def _spec_view(app, swagger, endpoint):
+    def view():
+        body, etag = render_spec(app, swagger, endpoint)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+    return view
+
+
+def main():
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python -m controllers.api_docs OUTPUT")
+    # Read by the copy of this module that main imports, which is not this __main__ one
+    os.environ['SWAGGER_ENABLED'] = '1'
+    os.environ.pop('SWAGGER_SPEC_PATH', None)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Importing main migrates its database; the spec does not depend on it, so use a throwaway one
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'apispec.db')
+        from controllers import api_docs
+        from main import app, swagger
+
+        body, _ = api_docs.render_spec(app, swagger)
+    directory = os.path.dirname(sys.argv[1])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(sys.argv[1], 'wb') as f:
+        f.write(body)
+    print(f"wrote {len(body)} bytes to {sys.argv[1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+
+READ_CHUNK_SIZE = 64 * 1024
+# A single row that cannot be decoded within this many characters is treated as malformed
+MAX_PENDING_CHARS = 1024 * 1024
+
+
+class MalformedBodyError(ValueError):
+    pass
+
+
+def iter_json_array(stream):
+    """Yield the elements of a top-level JSON array while reading ``stream`` chunk by chunk."""
+    return _utf8_only(_json_array_elements(stream))
+
+
+def _json_array_elements(stream):
+    reader = io.TextIOWrapper(stream, encoding='utf-8')
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def skip_whitespace():
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            buffer, pos = reader.read(READ_CHUNK_SIZE), 0
+            eof = not buffer
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise MalformedBodyError("Expected a JSON array")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == ']':
+        return
+
+    while True:
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof or len(buffer) - pos > MAX_PENDING_CHARS:
+                    raise MalformedBodyError("Malformed JSON array element")
+                chunk = reader.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+        pos = end
+        yield item
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise MalformedBodyError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+        if buffer[pos] != ',':
+            raise MalformedBodyError("Expected ',' or ']' between JSON array elements")
+        pos += 1
+        skip_whitespace()
+
+
+def iter_ndjson(stream):
+    """Yield one JSON document per non-blank line."""
+    return _utf8_only(_ndjson_documents(stream))
+
+
+def _ndjson_documents(stream):
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            raise MalformedBodyError(f"Malformed JSON on line {line_number}")
+
+
+def iter_csv(stream):
+    """Yield one dict per CSV record, keyed by the header row.
+
+    Quoting is strict, so an unterminated quote is an error instead of swallowing the rest of the body.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''), strict=True)
+    try:
+        yield from _utf8_only(reader)
+    except csv.Error as e:
+        raise MalformedBodyError(f"Malformed CSV on line {reader.line_num}: {e}")
+
+
+def _utf8_only(items):
+    """Re-raise a decoding error from the text wrapper as MalformedBodyError."""
+    try:
+        yield from items
+    except UnicodeDecodeError:
+        raise MalformedBodyError("Body is not valid UTF-8")
@@ -1,13 +1,28 @@
 import logging
-from flasgger import swag_from
 from flask import Blueprint, request, jsonify, make_response, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 from constants.app_constants import Roles
+from controllers.api_docs import swag_from
+from controllers.body_parsers import iter_csv, iter_json_array, iter_ndjson
+from controllers.errors import PoolTimeoutError, pool_exhausted
+from controllers.etag import entity_etag, is_not_modified, list_etag, not_modified, with_etag
+from controllers.fieldsets import requested_fieldset
+from controllers.links import LINKS_FULL, LINKS_NONE, link_for, resource_links
+from controllers.streaming import requested_stream_format, stream_response
 from services.book_service import BookService
+from services.fieldsets import InvalidFieldsError, project, select_columns
+from services.pagination import InvalidPageRequestError
+from services.version_service import BOOKS, VersionService
 
 books_bp = Blueprint('books', __name__)
 
+BULK_BODY_PARSERS = {
+    'application/json': iter_json_array,
+    'application/x-ndjson': iter_ndjson,
+    'text/csv': iter_csv,
+}
+
 @books_bp.route('/books', methods=['POST'])
 @jwt_required()
 @swag_from({
@@ -84,11 +99,89 @@ def create_book():
             "list": url_for('books.get_books', _external=True)
         }
         return make_response(jsonify(response), 201)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error creating book: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
 
 
+@books_bp.route('/books/bulk', methods=['POST'])
+@jwt_required()
+@swag_from({
+    'tags': ['Books'],
+    'description': 'Import many books in one upload. The body is read as a stream and inserted in batched '
+                   'transactions; invalid rows and ISBN conflicts are reported per row without aborting the upload',
+    'consumes': ['application/json', 'application/x-ndjson', 'text/csv'],
+    'parameters': [
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'required': True,
+            'description': 'JWT token (Bearer <token>)'
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'description': 'A JSON array of books, one book per line (application/x-ndjson) or CSV with a header '
+                           'row (text/csv), using the fields of the Book schema',
+            'schema': {
+                'type': 'array',
+                'items': {'$ref': '#/definitions/Book'}
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Import summary',
+            'examples': {
+                'application/json': {
+                    "received": 3,
+                    "inserted": 2,
+                    "rejected": 1,
+                    "errors": [
+                        {"row": 2, "isbn": "9780743273565", "error": "A book with this ISBN already exists"}
+                    ],
+                    "errors_truncated": False
+                }
+            }
+        },
+        400: {
+            'description': 'Malformed body; rows read before the error are kept and reported in the summary'
+        },
+        403: {
+            'description': 'User not authorized to import books'
+        },
+        415: {
+            'description': 'Unsupported content type'
+        },
+        500: {
+            'description': 'Internal server error'
+        }
+    }
+})
+def import_books():
+    current_user = get_jwt_identity()
+    claims = get_jwt()
+    if claims['role'] != Roles.ADMIN:
+        return make_response(jsonify({"message": "User not authorized to import books"}), 403)
+    parser = BULK_BODY_PARSERS.get(request.mimetype or 'application/json')
+    if parser is None:
+        return make_response(jsonify({"message": f"Unsupported content type {request.mimetype}"}), 415)
+    logging.info(f"User {current_user} is importing books ({request.mimetype})")
+    try:
+        summary = BookService.import_books(parser(request.stream))
+        logging.info(f"Book import by {current_user}: {summary['inserted']} inserted, {summary['rejected']} rejected")
+        return make_response(jsonify(summary), 400 if "error" in summary else 200)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
+    except Exception as e:
+        logging.error(f"Error importing books: {str(e)}")
+        return make_response(jsonify({"message": "Internal server error"}), 500)
+
+
 @books_bp.route('/books', methods=['GET'])
 @jwt_required()
 @swag_from({
@@ -105,9 +198,15 @@ def create_book():
         {'name': 'author', 'in': 'query', 'type': 'string', 'description': 'Filter books by author'},
         {'name': 'published_start', 'in': 'query', 'type': 'string', 'format': 'date', 'description': 'Filter books published after this date'},
         {'name': 'published_end', 'in': 'query', 'type': 'string', 'format': 'date', 'description': 'Filter books published before this date'},
-        {'name': 'search', 'in': 'query', 'type': 'string', 'description': 'Search books by title or author'},
-        {'name': 'page', 'in': 'query', 'type': 'integer', 'default': 1, 'description': 'Page number for pagination'},
+        {'name': 'search', 'in': 'query', 'type': 'string', 'description': 'Full-text search over title, author, ISBN and language; every word is matched as a prefix and results are ranked by relevance'},
+        {'name': 'sort', 'in': 'query', 'type': 'string', 'enum': ['published_date', 'title', 'author', 'id'], 'default': 'published_date', 'description': 'Sort key, ties are broken by id. Ignored when searching (results are ranked by relevance)'},
+        {'name': 'after', 'in': 'query', 'type': 'string', 'description': 'Opaque cursor from next_cursor of the previous page'},
+        {'name': 'page', 'in': 'query', 'type': 'integer', 'default': 1, 'description': 'Page number for pagination, prefer the after cursor for walking pages'},
         {'name': 'limit', 'in': 'query', 'type': 'integer', 'default': 10, 'description': 'Number of results per page for pagination'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links per item: none, compact (self only) or full'},
+        {'name': 'stream', 'in': 'query', 'type': 'boolean', 'description': 'Stream every matching book as a chunked JSON array instead of one page (send Accept: application/x-ndjson for NDJSON). Pagination fields are omitted and limit is only applied when given'},
+        {'name': 'count', 'in': 'query', 'type': 'string', 'enum': ['exact', 'estimate', 'none'], 'default': 'exact', 'description': 'How to compute total: exact, estimate (counts at most 1000 matches unless an exact total is cached) or none (total is null)'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated book fields to return, e.g. title,available_copies; id is always included and _links only when listed. Only the listed columns are read from the database'},
     ],
     'responses': {
         200: {
@@ -128,8 +227,10 @@ def create_book():
                         }
                     ],
                     "total": 1,
+                    "count": "exact",
                     "page": 1,
                     "limit": 10,
+                    "next_cursor": None,
                     "next_page": None,
                     "prev_page": None,
                     "_links": {
@@ -142,6 +243,12 @@ def create_book():
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Invalid sort key, count mode, cursor or field'
+        },
         500: {
             'description': 'Internal server error'
         }
@@ -158,44 +265,66 @@ def get_books():
     page = request.args.get('page', 1, type=int)
     limit = request.args.get('limit', 10, type=int)
     search = request.args.get('search')
+    sort = request.args.get('sort', 'published_date')
+    after = request.args.get('after')
+    count = request.args.get('count', 'exact')
 
+    fields, links = requested_fieldset()
+    stream_format = requested_stream_format()
     try:
-        books, total = BookService.get_books(author, published_start, published_end, page, limit, search)
+        etag = list_etag(*VersionService.get_table_versions(BOOKS))
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
+    except Exception as e:
+        logging.error(f"Error fetching books: {str(e)}")
+        return make_response(jsonify({"message": "Internal server error"}), 500)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    if stream_format:
+        try:
+            books = BookService.stream_books(author, published_start, published_end, search, sort, after,
+                                             request.args.get('limit', type=int), fields)
+            return with_etag(stream_response('books', books, lambda book: _add_book_links(book, links), stream_format),
+                             etag)
+        except (InvalidPageRequestError, InvalidFieldsError) as e:
+            return make_response(jsonify({"message": str(e)}), 400)
+
+    try:
+        books, total, next_cursor = BookService.get_books(author, published_start, published_end, page, limit, search,
+                                                          sort, after, count, fields)
 
         # Prepare pagination information
+        fields_arg = request.args.get('fields')
         next_page = url_for('books.get_books', author=author, published_start=published_start, published_end=published_end,
-                            page=page + 1, limit=limit, _external=True) if page * limit < total else None
+                            search=search, sort=sort, after=next_cursor, limit=limit, count=count, fields=fields_arg,
+                            _external=True) if next_cursor else None
         prev_page = url_for('books.get_books', author=author, published_start=published_start, published_end=published_end,
-                            page=page - 1, limit=limit, _external=True) if page > 1 else None
+                            search=search, sort=sort, page=page - 1, limit=limit, count=count, fields=fields_arg,
+                            _external=True) if page > 1 and not after else None
 
         # Add HATEOAS links to each book
         books_with_links = []
         for book in books:
-            book_dict = dict(book)
-            book_dict["_links"] = {
-                "self": url_for('books.get_book', book_id=book['id'], _external=True),
-                "update": {
-                    "href": url_for('books.update_book', book_id=book['id'], _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('books.delete_book', book_id=book['id'], _external=True),
-                    "method": "DELETE"
-                }
-            }
-            books_with_links.append(book_dict)
+            if links != LINKS_NONE:
+                book = dict(book)
+                _add_book_links(book, links)
+            books_with_links.append(book)
 
         # Prepare response with HATEOAS links
         response = {
             "books": books_with_links,
             "total": total,
+            "count": count,
             "page": page,
             "limit": limit,
+            "next_cursor": next_cursor,
             "next_page": next_page,
             "prev_page": prev_page,
             "_links": {
                 "self": url_for('books.get_books', page=page, limit=limit, author=author,
-                                published_start=published_start, published_end=published_end, _external=True),
+                                published_start=published_start, published_end=published_end, search=search,
+                                sort=sort, after=after, count=count, fields=fields_arg, _external=True),
                 "create": {
                     "href": url_for('books.create_book', _external=True),
                     "method": "POST"
@@ -203,12 +332,22 @@ def get_books():
             }
         }
 
-        return make_response(jsonify(response), 200)
+        return with_etag(make_response(jsonify(response), 200), etag)
+    except (InvalidPageRequestError, InvalidFieldsError) as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching books: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
 
 
+def _add_book_links(book, links=LINKS_FULL):
+    if links != LINKS_NONE:
+        book["_links"] = resource_links('books.get_book', 'books.update_book', 'books.delete_book', links,
+                                      book_id=book['id'])
+
+
 @books_bp.route('/books/<int:book_id>', methods=['GET'])
 @jwt_required()
 @swag_from({
@@ -222,7 +361,9 @@ def get_books():
             'required': True,
             'description': 'JWT token (Bearer <token>)'
         },
-        {'name': 'book_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The book identifier'}
+        {'name': 'book_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The book identifier'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated book fields to return, e.g. title,available_copies; id is always included and _links only when listed. Only the listed columns are read from the database'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links: none, compact (self only) or full'}
     ],
     'responses': {
         200: {
@@ -241,6 +382,12 @@ def get_books():
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Unknown field'
+        },
         404: {
             'description': 'Book not found'
         },
@@ -253,23 +400,25 @@ def get_book(book_id):
     current_user = get_jwt_identity()
     logging.info(f"User {current_user} is fetching book with id {book_id}")
     try:
-        book = BookService.get_book(book_id)
+        book, version = BookService.get_book_versioned(book_id)
         if book:
-            book["_links"] = {
-                "self": url_for('books.get_book', book_id=book_id, _external=True),
-                "update": {
-                    "href": url_for('books.update_book', book_id=book_id, _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('books.delete_book', book_id=book_id, _external=True),
-                    "method": "DELETE"
-                },
-                "list": url_for('books.get_books', _external=True)
-            }
-            return make_response(jsonify(book), 200)
+            fields, links = requested_fieldset()
+            columns = select_columns(fields, BookService.FIELDS)
+            etag = entity_etag(version, links, columns)
+            if is_not_modified(etag):
+                return not_modified(etag)
+            # Single books come from the row cache whole, so the fieldset is applied here
+            book = project(book, columns)
+            _add_book_links(book, links)
+            if links == LINKS_FULL:
+                book["_links"]["list"] = link_for('books.get_books')
+            return with_etag(make_response(jsonify(book), 200), etag)
         else:
             return make_response(jsonify({"message": "Book not found"}), 404)
+    except InvalidFieldsError as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching book with id {book_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -346,6 +495,8 @@ def update_book(book_id):
             "list": url_for('books.get_books', _external=True)
         }
         return make_response(jsonify(response), 200)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error updating book with id {book_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -398,6 +549,8 @@ def delete_book(book_id):
             "list": url_for('books.get_books', _external=True)
         }
         return make_response(jsonify(response), 200)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error deleting book with id {book_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -0,0 +1,143 @@
+import os
+import time
+import zlib
+
+from flask import request
+
+from services.metrics import counter, histogram
+
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Bodies smaller than this many bytes are sent as is; headers would eat most of the saving
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# zlib level 1 (fastest) to 9 (smallest)
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/javascript',
+                          'image/svg+xml')
+# Preferred first when the client rates both equally. "deflate" is the zlib format (RFC 9110)
+ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+
+compressed_responses = counter('http_compressed_responses_total', 'Responses sent compressed',
+                               ('endpoint', 'encoding'))
+compression_seconds = counter('http_compression_seconds_total', 'CPU time spent compressing response bodies',
+                              ('endpoint', 'encoding'))
+compression_input_bytes = counter('http_compression_input_bytes_total', 'Response bytes before compression',
+                                  ('endpoint', 'encoding'))
+compression_output_bytes = counter('http_compression_output_bytes_total', 'Response bytes after compression',
+                                   ('endpoint', 'encoding'))
+compression_ratio = histogram('http_compression_ratio', 'Compressed size as a fraction of the original',
+                              ('endpoint',), RATIO_BUCKETS)
+
+
+def init_compression(app):
+    """Compress ``app``'s responses with gzip or deflate when the client accepts it.
+
+    Register after init_request_metrics, so its after_request hook runs first and the
+    request metrics count the bytes actually sent.
+    """
+    if COMPRESSION_ENABLED:
+        app.after_request(_compress_response)
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick the encoding the client rates highest, or None if it accepts neither."""
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compress_response(response):
+    if response.status_code == 304:
+        # Revalidates a 200 that carried a weak ETag if the client accepts an encoding; send the same form
+        response.vary.add('Accept-Encoding')
+        if negotiate_encoding(request.accept_encodings) is not None:
+            _weaken_etag(response)
+        return response
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    # The compressed bytes differ from the identity ones, so a strong validator no longer applies. The ETag is
+    # weakened whenever the client accepts an encoding, even for bodies too small to compress, so its form
+    # depends only on the request. If-None-Match uses weak comparison, so either form still gets a 304
+    _weaken_etag(response)
+    if request.method == 'HEAD':
+        return response
+    endpoint = request.endpoint or 'unmatched'
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, endpoint)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        start = time.thread_time()
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, ENCODINGS[encoding])
+        compressed = compressor.compress(data) + compressor.flush()
+        _observe(endpoint, encoding, time.thread_time() - start, len(data), len(compressed))
+        response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _compressible(response):
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _compress_stream(chunks, encoding, endpoint):
+    """Compress a streamed body chunk by chunk.
+
+    Each chunk is sync-flushed, so the client can decode every row batch as soon as it arrives.
+    """
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, ENCODINGS[encoding])
+    seconds = 0.0
+    size_in = size_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            start = time.thread_time()
+            compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            seconds += time.thread_time() - start
+            size_in += len(chunk)
+            size_out += len(compressed)
+            yield compressed
+        start = time.thread_time()
+        tail = compressor.flush()
+        seconds += time.thread_time() - start
+        size_out += len(tail)
+        yield tail
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        _observe(endpoint, encoding, seconds, size_in, size_out)
+
+
+def _observe(endpoint, encoding, seconds, size_in, size_out):
+    compressed_responses.inc(endpoint, encoding)
+    compression_seconds.inc(endpoint, encoding, amount=seconds)
+    compression_input_bytes.inc(endpoint, encoding, amount=size_in)
+    compression_output_bytes.inc(endpoint, encoding, amount=size_out)
+    if size_in:
+        compression_ratio.observe(size_out / size_in, endpoint)
@@ -0,0 +1,21 @@
+import logging
+
+from flask import jsonify, make_response
+
+from config.connection_pool import PoolTimeoutError
+
+# Seconds a client should wait before retrying when no database connection was free
+POOL_RETRY_AFTER = 1
+
+
+def pool_exhausted(error):
+    """503 for a request that waited DB_POOL_TIMEOUT without getting a connection; retrying later can succeed."""
+    logging.warning(f"Database pool exhausted: {str(error)}")
+    response = make_response(jsonify({"message": "Server is busy, please retry shortly"}), 503)
+    response.headers['Retry-After'] = str(POOL_RETRY_AFTER)
+    return response
+
+
+def init_error_handlers(app):
+    """Map errors raised outside the controllers' own try blocks, e.g. in the auth routes."""
+    app.register_error_handler(PoolTimeoutError, pool_exhausted)
@@ -0,0 +1,45 @@
+import hashlib
+from datetime import date
+
+from flask import make_response, request
+
+from controllers.streaming import requested_stream_format
+
+
+def entity_etag(version, links, columns=None):
+    """Strong ETag for a single resource: its row version plus everything else that shapes the body."""
+    if columns is None:
+        return _digest(request.url_root, links, version)
+    return _digest(request.url_root, links, version, tuple(columns))
+
+
+def list_etag(*table_versions, date_dependent=False):
+    """Strong ETag for a list response, valid until one of the listed tables changes.
+
+    The full request URL covers filters, paging and the links mode; ``date_dependent`` folds
+    in today's date for lists whose rows depend on it (e.g. the overdue loan filter).
+    """
+    parts = [request.url, requested_stream_format(), *table_versions]
+    if date_dependent:
+        parts.append(date.today().isoformat())
+    return _digest(*parts)
+
+
+def is_not_modified(etag):
+    # If-None-Match uses the weak comparison function (RFC 7232, section 3.2)
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
+
+
+def _digest(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
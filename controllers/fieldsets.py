@@ -0,0 +1,22 @@
+from flask import request
+
+from controllers.links import LINKS_NONE, requested_links_mode
+
+LINKS_FIELD = '_links'
+
+
+def requested_fieldset():
+    """Read ?fields=a,b,c and ?links=; return the requested column names (None for all) and the links mode.
+
+    ``_links`` counts as a field: when ?fields= is given without it, items carry no links.
+    """
+    links = requested_links_mode()
+    value = request.args.get('fields')
+    if value is None:
+        return None, links
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if LINKS_FIELD in fields:
+        fields = [field for field in fields if field != LINKS_FIELD]
+    else:
+        links = LINKS_NONE
+    return fields, links
@@ -0,0 +1,64 @@
+from flask import request, url_for
+
+LINKS_NONE = 'none'
+LINKS_COMPACT = 'compact'
+LINKS_FULL = 'full'
+LINKS_MODES = (LINKS_NONE, LINKS_COMPACT, LINKS_FULL)
+
+# Stand-in id used to find where the id goes in a built URL; routes take <int:...> ids
+_PLACEHOLDER = 9876543210123
+_MAX_TEMPLATES = 512
+
+# (url root, endpoint, parameter names) -> URL split around the placeholder
+_templates = {}
+
+
+def requested_links_mode():
+    """Read ?links=none|compact|full; anything else falls back to full links."""
+    mode = request.args.get('links', LINKS_FULL)
+    return mode if mode in LINKS_MODES else LINKS_FULL
+
+
+def link_for(endpoint, **values):
+    """Same result as url_for(endpoint, **values, _external=True) for routes with at most one id.
+
+    The route is reversed once per host and endpoint; afterwards the id is spliced into the
+    cached template with string concatenation instead of a full url_for call.
+    """
+    key = (request.url_root, endpoint, tuple(values))
+    parts = _templates.get(key)
+    if parts is None:
+        parts = _build_template(endpoint, values)
+        if len(_templates) >= _MAX_TEMPLATES:
+            # Host headers are client controlled, so keep the cache bounded
+            _templates.clear()
+        _templates[key] = parts
+    if len(parts) == 1:
+        return parts[0]
+    return parts[0] + str(next(iter(values.values()))) + parts[1]
+
+
+def resource_links(view_endpoint, update_endpoint, delete_endpoint, mode=LINKS_FULL, **values):
+    if mode == LINKS_COMPACT:
+        return {"self": link_for(view_endpoint, **values)}
+    return {
+        "self": link_for(view_endpoint, **values),
+        "update": {
+            "href": link_for(update_endpoint, **values),
+            "method": "PUT"
+        },
+        "delete": {
+            "href": link_for(delete_endpoint, **values),
+            "method": "DELETE"
+        }
+    }
+
+
+def _build_template(endpoint, values):
+    if len(values) > 1:
+        raise ValueError(f"link_for supports at most one route parameter, got {', '.join(values)}")
+    url = url_for(endpoint, _external=True, **{name: _PLACEHOLDER for name in values})
+    if not values:
+        return (url,)
+    prefix, _, suffix = url.partition(str(_PLACEHOLDER))
+    return prefix, suffix
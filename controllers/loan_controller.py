@@ -1,10 +1,18 @@
 import logging
-from flasgger import swag_from
 from flask import Blueprint, request, jsonify, make_response, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 from constants.app_constants import Roles
+from controllers.api_docs import swag_from
+from controllers.errors import PoolTimeoutError, pool_exhausted
+from controllers.etag import entity_etag, is_not_modified, list_etag, not_modified, with_etag
+from controllers.fieldsets import requested_fieldset
+from controllers.links import LINKS_FULL, LINKS_NONE, link_for, resource_links
+from controllers.streaming import requested_stream_format, stream_response
+from services.fieldsets import InvalidFieldsError, project, select_columns
 from services.loan_service import LoanService
+from services.pagination import InvalidPageRequestError
+from services.version_service import LOANS, VersionService
 
 loans_bp = Blueprint('loans', __name__)
 
@@ -82,6 +90,8 @@ def create_loan():
                 }
             }
         return make_response(jsonify(response), status)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error creating loan: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -91,7 +101,7 @@ def create_loan():
 @jwt_required()
 @swag_from({
     'tags': ['Loans'],
-    'description': 'Retrieve a list of all loan records',
+    'description': 'Retrieve loan records, filtered and paginated by loan date',
     'parameters': [
         {
             'name': 'Authorization',
@@ -99,7 +109,18 @@ def create_loan():
             'type': 'string',
             'required': True,
             'description': 'JWT token (Bearer <token>)'
-        }
+        },
+        {'name': 'member_id', 'in': 'query', 'type': 'integer', 'description': 'Filter loans by member'},
+        {'name': 'book_id', 'in': 'query', 'type': 'integer', 'description': 'Filter loans by book'},
+        {'name': 'status', 'in': 'query', 'type': 'string', 'enum': ['active', 'returned', 'overdue'], 'description': 'active: not returned yet, returned: returned, overdue: not returned and past its return date'},
+        {'name': 'loan_date_from', 'in': 'query', 'type': 'string', 'format': 'date', 'description': 'Filter loans made on or after this date'},
+        {'name': 'loan_date_to', 'in': 'query', 'type': 'string', 'format': 'date', 'description': 'Filter loans made on or before this date'},
+        {'name': 'after', 'in': 'query', 'type': 'string', 'description': 'Opaque cursor from next_cursor of the previous page'},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'default': 50, 'description': 'Number of results per page'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links per item: none, compact (self only) or full'},
+        {'name': 'stream', 'in': 'query', 'type': 'boolean', 'description': 'Stream every matching loan as a chunked JSON array instead of one page (send Accept: application/x-ndjson for NDJSON). Pagination fields are omitted and limit is only applied when given'},
+        {'name': 'count', 'in': 'query', 'type': 'string', 'enum': ['exact', 'none'], 'default': 'exact', 'description': 'Whether to compute total'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated loan fields to return, e.g. book_id,return_date; id is always included and _links only when listed. Only the listed columns are read from the database'},
     ],
     'responses': {
         200: {
@@ -116,10 +137,20 @@ def create_loan():
                             "actual_return_date": None,
                             "fine": 0
                         }
-                    ]
+                    ],
+                    "total": 1,
+                    "limit": 50,
+                    "next_cursor": None,
+                    "next_page": None
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Invalid member_id, book_id, status, count mode, cursor or field'
+        },
         500: {
             'description': 'Internal server error'
         }
@@ -127,28 +158,79 @@ def create_loan():
 })
 def get_loans():
     try:
-        loans = LoanService.get_loans()
+        member_id = _id_arg('member_id')
+        book_id = _id_arg('book_id')
+    except ValueError as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    status = request.args.get('status')
+    loan_date_from = request.args.get('loan_date_from')
+    loan_date_to = request.args.get('loan_date_to')
+    after = request.args.get('after')
+    limit = request.args.get('limit', 50, type=int)
+    count = request.args.get('count', 'exact')
+
+    fields, links = requested_fieldset()
+    stream_format = requested_stream_format()
+    try:
+        etag = list_etag(*VersionService.get_table_versions(LOANS), date_dependent=status is not None)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
+    except Exception as e:
+        logging.error(f"Error fetching loans: {str(e)}")
+        return make_response(jsonify({"message": "Internal server error"}), 500)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    if stream_format:
+        try:
+            loans = LoanService.stream_loans(member_id, book_id, status, loan_date_from, loan_date_to, after,
+                                             request.args.get('limit', type=int), fields)
+            return with_etag(stream_response('loans', loans, lambda loan: _add_loan_links(loan, links), stream_format),
+                             etag)
+        except (InvalidPageRequestError, InvalidFieldsError) as e:
+            return make_response(jsonify({"message": str(e)}), 400)
+
+    try:
+        loans, total, next_cursor = LoanService.get_loans(member_id, book_id, status, loan_date_from, loan_date_to,
+                                                          limit, after, count, fields)
+        next_page = url_for('loans.get_loans', member_id=member_id, book_id=book_id, status=status,
+                            loan_date_from=loan_date_from, loan_date_to=loan_date_to, after=next_cursor,
+                            limit=limit, count=count, fields=request.args.get('fields'),
+                            _external=True) if next_cursor else None
         loans_with_links = []
         for loan in loans:
-            loan_dict = dict(loan)
-            loan_dict["_links"] = {
-                "self": url_for('loans.get_loan', loan_id=loan['id'], _external=True),
-                "update": {
-                    "href": url_for('loans.update_loan', loan_id=loan['id'], _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('loans.delete_loan', loan_id=loan['id'], _external=True),
-                    "method": "DELETE"
-                }
-            }
-            loans_with_links.append(loan_dict)
-        return make_response(jsonify({"loans": loans_with_links}), 200)
+            if links != LINKS_NONE:
+                loan = dict(loan)
+                _add_loan_links(loan, links)
+            loans_with_links.append(loan)
+        return with_etag(make_response(jsonify({"loans": loans_with_links, "total": total, "limit": limit,
+                                                "next_cursor": next_cursor, "next_page": next_page}), 200), etag)
+    except (InvalidPageRequestError, InvalidFieldsError) as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching loans: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
 
 
+def _id_arg(name):
+    """Optional integer query parameter; a value that is not an integer raises ValueError instead of being dropped."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def _add_loan_links(loan, links=LINKS_FULL):
+    if links != LINKS_NONE:
+        loan["_links"] = resource_links('loans.get_loan', 'loans.update_loan', 'loans.delete_loan', links,
+                                      loan_id=loan['id'])
+
+
 @loans_bp.route('/loans/<int:loan_id>', methods=['GET'])
 @jwt_required()
 @swag_from({
@@ -162,7 +244,9 @@ def get_loans():
             'required': True,
             'description': 'JWT token (Bearer <token>)'
         },
-        {'name': 'loan_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The loan identifier'}
+        {'name': 'loan_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The loan identifier'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated loan fields to return, e.g. book_id,return_date; id is always included and _links only when listed. Only the listed columns are read from the database'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links: none, compact (self only) or full'}
     ],
     'responses': {
         200: {
@@ -179,6 +263,12 @@ def get_loans():
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Unknown field'
+        },
         404: {
             'description': 'Loan not found'
         },
@@ -189,26 +279,28 @@ def get_loans():
 })
 def get_loan(loan_id):
     try:
-        loan = LoanService.get_loan(loan_id)
+        loan, version = LoanService.get_loan_versioned(loan_id)
         if loan:
-            loan["_links"] = {
-                "self": url_for('loans.get_loan', loan_id=loan_id, _external=True),
-                "update": {
-                    "href": url_for('loans.update_loan', loan_id=loan_id, _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('loans.delete_loan', loan_id=loan_id, _external=True),
-                    "method": "DELETE"
-                },
-                "list": {
-                    "href": url_for('loans.get_loans', _external=True),
+            fields, links = requested_fieldset()
+            columns = select_columns(fields, LoanService.FIELDS)
+            etag = entity_etag(version, links, columns)
+            if is_not_modified(etag):
+                return not_modified(etag)
+            # Single loans come from the row cache whole, so the fieldset is applied here
+            loan = project(loan, columns)
+            _add_loan_links(loan, links)
+            if links == LINKS_FULL:
+                loan["_links"]["list"] = {
+                    "href": link_for('loans.get_loans'),
                     "method": "GET"
                 }
-            }
-            return make_response(jsonify(loan), 200)
+            return with_etag(make_response(jsonify(loan), 200), etag)
         else:
             return make_response(jsonify({"message": "Loan not found"}), 404)
+    except InvalidFieldsError as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching loan with id {loan_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -283,6 +375,8 @@ def update_loan(loan_id):
                 }
             }
         return make_response(jsonify(response), status)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error updating loan with id {loan_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -339,6 +433,8 @@ def delete_loan(loan_id):
                 }
             }
         return make_response(jsonify(response), status)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error deleting loan with id {loan_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
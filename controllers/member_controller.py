@@ -1,10 +1,18 @@
 import logging
-from flasgger import swag_from
 from flask import Blueprint, request, jsonify, make_response, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 from constants.app_constants import Roles
+from controllers.api_docs import swag_from
+from controllers.errors import PoolTimeoutError, pool_exhausted
+from controllers.etag import entity_etag, is_not_modified, list_etag, not_modified, with_etag
+from controllers.fieldsets import requested_fieldset
+from controllers.links import LINKS_FULL, LINKS_NONE, link_for, resource_links
+from controllers.streaming import requested_stream_format, stream_response
+from services.fieldsets import InvalidFieldsError, project, select_columns
 from services.member_service import MemberService
+from services.pagination import InvalidPageRequestError
+from services.version_service import MEMBERS, VersionService
 
 members_bp = Blueprint('members', __name__)
 
@@ -12,7 +20,7 @@ members_bp = Blueprint('members', __name__)
 @jwt_required()
 @swag_from({
     'tags': ['Members'],
-    'description': 'Retrieve a list of all members',
+    'description': 'Retrieve members, optionally by exact email or name prefix, paginated with a cursor',
     'parameters': [
         {
             'name': 'Authorization',
@@ -20,7 +28,16 @@ members_bp = Blueprint('members', __name__)
             'type': 'string',
             'required': True,
             'description': 'JWT token (Bearer <token>)'
-        }
+        },
+        {'name': 'email', 'in': 'query', 'type': 'string', 'description': 'Members with exactly this email'},
+        {'name': 'name', 'in': 'query', 'type': 'string', 'description': 'Members whose name starts with this text, ignoring case; results are ordered by name'},
+        {'name': 'sort', 'in': 'query', 'type': 'string', 'enum': ['id', 'name'], 'default': 'id', 'description': 'Sort key; name sorts ignoring case with ties broken by id. Ignored when searching by name'},
+        {'name': 'after', 'in': 'query', 'type': 'string', 'description': 'Opaque cursor from next_cursor of the previous page'},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'default': 50, 'description': 'Number of results per page'},
+        {'name': 'count', 'in': 'query', 'type': 'string', 'enum': ['exact', 'none'], 'default': 'exact', 'description': 'Whether to compute total'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links per item: none, compact (self only) or full'},
+        {'name': 'stream', 'in': 'query', 'type': 'boolean', 'description': 'Stream every matching member as a chunked JSON array instead of one page (send Accept: application/x-ndjson for NDJSON). Pagination fields are omitted and limit is only applied when given'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated member fields to return, e.g. name,email; id is always included and _links only when listed. Only the listed columns are read from the database'},
     ],
     'responses': {
         200: {
@@ -45,42 +62,72 @@ members_bp = Blueprint('members', __name__)
                                 }
                             }
                         }
-                    ]
+                    ],
+                    "total": 1,
+                    "limit": 50,
+                    "next_cursor": None,
+                    "next_page": None
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Invalid sort key, count mode, cursor or field'
+        },
         500: {
             'description': 'Internal server error'
         }
     }
 })
 def get_members():
+    email = request.args.get('email')
+    name = request.args.get('name')
+    sort = request.args.get('sort', 'id')
+    after = request.args.get('after')
+    limit = request.args.get('limit', 50, type=int)
+    count = request.args.get('count', 'exact')
     try:
         current_user = get_jwt_identity()
-        logging.info(f"User {current_user} is trying to get all members")
-        members = MemberService.get_members()
+        logging.info(f"User {current_user} is trying to get members")
+        fields, links = requested_fieldset()
+        stream_format = requested_stream_format()
+        etag = list_etag(*VersionService.get_table_versions(MEMBERS))
+        if is_not_modified(etag):
+            return not_modified(etag)
+        if stream_format:
+            members = MemberService.stream_members(email, name, sort, after, request.args.get('limit', type=int),
+                                                   fields)
+            return with_etag(stream_response('members', members, lambda member: _add_member_links(member, links),
+                                             stream_format), etag)
+        members, total, next_cursor = MemberService.get_members(email, name, sort, limit, after, count, fields)
+        next_page = url_for('members.get_members', email=email, name=name, sort=sort, after=next_cursor, limit=limit,
+                            count=count, fields=request.args.get('fields'), _external=True) if next_cursor else None
         members_with_links = []
         for member in members:
-            member_dict = dict(member)
-            member_dict["_links"] = {
-                "self": url_for('members.get_member_by_id', member_id=member['id'], _external=True),
-                "update": {
-                    "href": url_for('members.update_member', member_id=member['id'], _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('members.delete_member', member_id=member['id'], _external=True),
-                    "method": "DELETE"
-                }
-            }
-            members_with_links.append(member_dict)
-        return make_response(jsonify({"members": members_with_links}), 200)
+            if links != LINKS_NONE:
+                member = dict(member)
+                _add_member_links(member, links)
+            members_with_links.append(member)
+        return with_etag(make_response(jsonify({"members": members_with_links, "total": total, "limit": limit,
+                                                "next_cursor": next_cursor, "next_page": next_page}), 200), etag)
 
+    except (InvalidPageRequestError, InvalidFieldsError) as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching members: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
 
 
+def _add_member_links(member, links=LINKS_FULL):
+    if links != LINKS_NONE:
+        member["_links"] = resource_links('members.get_member_by_id', 'members.update_member', 'members.delete_member', links,
+                                      member_id=member['id'])
+
+
 @members_bp.route('/members/<int:member_id>', methods=['GET'])
 @jwt_required()
 @swag_from({
@@ -94,7 +141,9 @@ def get_members():
             'required': True,
             'description': 'JWT token (Bearer <token>)'
         },
-        {'name': 'member_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The member identifier'}
+        {'name': 'member_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': 'The member identifier'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'description': 'Comma-separated member fields to return, e.g. name,email; id is always included and _links only when listed. Only the listed columns are read from the database'},
+        {'name': 'links', 'in': 'query', 'type': 'string', 'enum': ['none', 'compact', 'full'], 'default': 'full', 'description': 'HATEOAS links: none, compact (self only) or full'}
     ],
     'responses': {
         200: {
@@ -120,6 +169,12 @@ def get_members():
                 }
             }
         },
+        304: {
+            'description': 'Not modified; the ETag sent in If-None-Match is still current'
+        },
+        400: {
+            'description': 'Unknown field'
+        },
         404: {
             'description': 'Member not found'
         },
@@ -132,24 +187,25 @@ def get_member_by_id(member_id):
     try:
         current_user = get_jwt_identity()
         logging.info(f"User {current_user} is trying to get member {member_id}")
-        member = MemberService.get_member_by_id(member_id)
+        member, version = MemberService.get_member_versioned(member_id)
         if member:
-            member_dict = dict(member)
-            member_dict["_links"] = {
-                "self": url_for('members.get_member_by_id', member_id=member_id, _external=True),
-                "update": {
-                    "href": url_for('members.update_member', member_id=member_id, _external=True),
-                    "method": "PUT"
-                },
-                "delete": {
-                    "href": url_for('members.delete_member', member_id=member_id, _external=True),
-                    "method": "DELETE"
-                },
-                "list": url_for('members.get_members', _external=True)
-            }
-            return make_response(jsonify(member_dict), 200)
+            fields, links = requested_fieldset()
+            columns = select_columns(fields, MemberService.FIELDS)
+            etag = entity_etag(version, links, columns)
+            if is_not_modified(etag):
+                return not_modified(etag)
+            # Single members come from the row cache whole, so the fieldset is applied here
+            member_dict = dict(project(member, columns))
+            _add_member_links(member_dict, links)
+            if links == LINKS_FULL:
+                member_dict["_links"]["list"] = link_for('members.get_members')
+            return with_etag(make_response(jsonify(member_dict), 200), etag)
         else:
             return make_response(jsonify({"message": "Member not found"}), 404)
+    except InvalidFieldsError as e:
+        return make_response(jsonify({"message": str(e)}), 400)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error fetching member with id {member_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -214,6 +270,8 @@ def update_member(member_id):
     try:
         response = MemberService.update_member(member_id, data)
         return make_response(jsonify(response), 200)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error updating member with id {member_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
@@ -263,6 +321,8 @@ def delete_member(member_id):
             return make_response(jsonify({"message": "User not authorized to delete member"}), 403)
         response = MemberService.delete_member(member_id)
         return make_response(jsonify(response), 200)
+    except PoolTimeoutError as e:
+        return pool_exhausted(e)
     except Exception as e:
         logging.error(f"Error deleting member with id {member_id}: {str(e)}")
         return make_response(jsonify({"message": "Internal server error"}), 500)
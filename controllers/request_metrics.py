@@ -0,0 +1,91 @@
+import time
+
+from flask import Response, g, request
+
+from config.instrumentation import begin_scope, end_scope
+from config.sqlite_config import get_pool_stats
+from services.cache import get_cache_stats
+from services.metrics import PROMETHEUS_CONTENT_TYPE, counter, histogram, render_prometheus
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requests that matched no route are grouped together so unknown URLs cannot create new series
+UNMATCHED = 'unmatched'
+
+request_seconds = histogram('http_request_duration_seconds', 'Request latency, including streamed bodies',
+                            ('endpoint', 'method'), LATENCY_BUCKETS)
+requests_total = counter('http_requests_total', 'Requests by endpoint, method and status',
+                         ('endpoint', 'method', 'status'))
+sql_statements = counter('http_sql_statements_total', 'SQL statements executed while serving requests',
+                         ('endpoint',))
+sql_seconds = counter('http_sql_seconds_total', 'Time spent in SQLite (execute and fetch) while serving requests',
+                      ('endpoint',))
+sql_rows = counter('http_sql_rows_total', 'Rows fetched from SQLite while serving requests', ('endpoint',))
+response_bytes = counter('http_response_bytes_total', 'Response body bytes sent', ('endpoint',))
+
+
+def init_request_metrics(app):
+    """Record per-endpoint request metrics on ``app`` and serve them at /metrics.
+
+    Only called when METRICS_ENABLED is set, so a disabled app pays nothing for the hooks.
+    """
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+
+def metrics():
+    pool = get_pool_stats()
+    caches = get_cache_stats()
+    extra = [
+        ('db_pool_connections', 'Pooled SQLite connections by state',
+         {(('state', state),): pool[state] for state in ('in_use', 'idle')}),
+        ('db_pool_wait_seconds_total', 'Total time spent waiting for a pooled connection',
+         {(): pool['wait_time_total']}),
+        ('cache_hits', 'Entity cache hits', {(('cache', name),): stats['hits'] for name, stats in caches.items()}),
+        ('cache_misses', 'Entity cache misses',
+         {(('cache', name),): stats['misses'] for name, stats in caches.items()}),
+        ('cache_entries', 'Entries held by each cache',
+         {(('cache', name),): stats['size'] for name, stats in caches.items()}),
+    ]
+    return Response(render_prometheus(extra), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    begin_scope()
+
+
+def _finish_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or UNMATCHED
+    method = request.method
+    status = response.status_code
+    if response.is_streamed:
+        # The body is produced after this hook returns; record once the last chunk has been sent
+        response.response = _measure_stream(response.response, start, endpoint, method, status)
+    else:
+        _observe(start, endpoint, method, status, response.calculate_content_length() or 0)
+    return response
+
+
+def _measure_stream(chunks, start, endpoint, method, status):
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        _observe(start, endpoint, method, status, sent)
+
+
+def _observe(start, endpoint, method, status, body_bytes):
+    stats = end_scope()
+    request_seconds.observe(time.perf_counter() - start, endpoint, method)
+    requests_total.inc(endpoint, method, str(status))
+    response_bytes.inc(endpoint, amount=body_bytes)
+    if stats is not None:
+        sql_statements.inc(endpoint, amount=stats.statements)
+        sql_seconds.inc(endpoint, amount=stats.seconds)
+        sql_rows.inc(endpoint, amount=stats.rows)
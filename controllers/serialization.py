@@ -0,0 +1,57 @@
+"""Response JSON encoding: orjson when it is installed, the standard library encoder otherwise.
+
+Installed with ``app.json_encoder = JSONEncoder``, so ``jsonify`` and every other Flask JSON
+helper go through it. Both encoders write ``sqlite3.Row`` objects as JSON objects, so services
+can hand rows straight to the response instead of copying each one into a dict first.
+"""
+import logging
+import os
+import sqlite3
+
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 'auto' uses orjson when it is installed; 'stdlib' always uses the standard library encoder
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto').lower()
+
+if JSON_ENCODER == 'orjson' and orjson is None:
+    logging.warning("JSON_ENCODER=orjson but orjson is not installed; using the standard library encoder")
+USE_ORJSON = orjson is not None and JSON_ENCODER != 'stdlib'
+
+if USE_ORJSON:
+    # Dates and dataclasses go through JSONEncoder.default, so the output matches Flask's encoder
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class JSONEncoder(FlaskJSONEncoder):
+
+    def default(self, o):
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return super().default(o)
+
+    def encode(self, o):
+        if USE_ORJSON and self.indent in (None, 2):
+            options = _ORJSON_OPTIONS
+            if self.sort_keys:
+                options |= orjson.OPT_SORT_KEYS
+            if self.indent:
+                options |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(o, default=self.default, option=options).decode()
+            except orjson.JSONEncodeError:
+                # e.g. integers beyond 64 bits, which the standard library encoder still handles
+                pass
+        return super().encode(o)
+
+
+_compact_encoder = JSONEncoder(separators=(',', ':'))
+
+
+def dumps(o):
+    """Compact JSON text for ``o`` with keys in insertion order, e.g. for streamed chunks."""
+    return _compact_encoder.encode(o)
@@ -0,0 +1,47 @@
+from flask import Response, request, stream_with_context
+
+from controllers.serialization import dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_NDJSON = 'ndjson'
+STREAM_JSON = 'json'
+ROWS_PER_CHUNK = 100
+
+
+def requested_stream_format():
+    """Return the streaming format the client asked for, or None for a regular paginated response.
+
+    ``Accept: application/x-ndjson`` selects one JSON document per line and ``?stream=true``
+    selects a chunked JSON object with the same shape as the paginated response body.
+    """
+    if NDJSON_MIMETYPE in request.accept_mimetypes.values():
+        return STREAM_NDJSON
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return STREAM_JSON
+    return None
+
+
+def stream_response(key, items, add_links, stream_format):
+    """Serialize ``items`` lazily as they are read, so memory stays flat regardless of result size."""
+    def generate():
+        if stream_format == STREAM_JSON:
+            yield '{"' + key + '":['
+        separator = ''
+        chunk = []
+        for item in items:
+            add_links(item)
+            if stream_format == STREAM_NDJSON:
+                chunk.append(dumps(item) + '\n')
+            else:
+                chunk.append(separator + dumps(item))
+                separator = ','
+            if len(chunk) >= ROWS_PER_CHUNK:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        if stream_format == STREAM_JSON:
+            yield ']}'
+
+    mimetype = NDJSON_MIMETYPE if stream_format == STREAM_NDJSON else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
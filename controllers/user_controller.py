@@ -1,8 +1,8 @@
-from flasgger import swag_from
 from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 
 from constants.app_constants import Roles
+from controllers.api_docs import swag_from
 from services.auth_service import AuthService
 
 auth_bp = Blueprint('auth', __name__)
@@ -86,7 +86,8 @@ def register():
             'description': 'User logged in successfully',
             'examples': {
                 'application/json': {
-                    "access_token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9..."
+                    "access_token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...",
+                    "refresh_token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9..."
                 }
             }
         },
@@ -95,6 +96,9 @@ def register():
         },
         500: {
             'description': 'Internal server error'
+        },
+        503: {
+            'description': 'Too many password checks in progress; retry shortly'
         }
     }
 })
@@ -105,6 +109,47 @@ def login():
     return jsonify(response), status
 
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+@swag_from({
+    'tags': ['Auth'],
+    'description': 'Exchange a refresh token for a new access token, without sending the password again',
+    'parameters': [
+        {
+            'name': 'Authorization',
+            'in': 'header',
+            'type': 'string',
+            'required': True,
+            'description': 'Refresh token returned by /auth/login (Bearer <token>)'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'New access token',
+            'examples': {
+                'application/json': {
+                    "access_token": "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9..."
+                }
+            }
+        },
+        401: {
+            'description': 'Missing, invalid or expired refresh token, or the user is no longer active'
+        }
+    }
+})
+def refresh():
+    """Renew an access token"""
+    response, status = AuthService.refresh(get_jwt_identity())
+    return jsonify(response), status
+
+
+@auth_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def auth_stats():
+    """Login throughput and password hashing statistics"""
+    return jsonify(AuthService.get_stats()), 200
+
+
 @auth_bp.route('/protected', methods=['GET'])
 @jwt_required()
 @swag_from({
@@ -1,7 +1,19 @@
 class BookDaoQueries:
+    COLUMNS = ('id', 'title', 'author', 'published_date', 'isbn', 'number_of_pages', 'cover_image', 'language',
+               'available_copies')
+
+    @staticmethod
+    def select_list(columns):
+        """Qualified column list for a SELECT, or every column when ``columns`` is None."""
+        if columns is None:
+            return "Books.*"
+        return ", ".join(f"Books.{column}" for column in columns)
+
     @staticmethod
-    def get_all_books():
-        return "SELECT * FROM Books"
+    def get_all_books(columns=None):
+        if columns is None:
+            return "SELECT * FROM Books"
+        return f"SELECT {BookDaoQueries.select_list(columns)} FROM Books"
 
     @staticmethod
     def get_book_by_id():
@@ -27,8 +39,44 @@ class BookDaoQueries:
 
     @staticmethod
     def update_available_copies_when_loaned():
-        return "UPDATE Books SET available_copies = available_copies - 1 WHERE id = ?"
+        # Only succeeds (rowcount 1) while a copy is left, so concurrent checkouts cannot oversell
+        return "UPDATE Books SET available_copies = available_copies - 1 WHERE id = ? AND available_copies > 0"
 
     @staticmethod
     def update_available_copies_when_returned():
         return "UPDATE Books SET available_copies = available_copies + 1 WHERE id = ?"
+
+    @staticmethod
+    def get_books_matching_search(columns=None):
+        return f"SELECT {BookDaoQueries.select_list(columns)} " \
+               "FROM Books JOIN Books_fts ON Books_fts.rowid = Books.id WHERE Books_fts MATCH ?"
+
+    @staticmethod
+    def get_book_ids_matching_search():
+        return "SELECT Books.id FROM Books JOIN Books_fts ON Books_fts.rowid = Books.id WHERE Books_fts MATCH ?"
+
+    @staticmethod
+    def get_books_by_ids(count, columns=None):
+        return f"SELECT {BookDaoQueries.select_list(columns)} FROM Books WHERE id IN (" + ", ".join("?" * count) + ")"
+
+    @staticmethod
+    def search_rank():
+        # bm25 with the column weights configured for Books_fts by migration 0002
+        return "Books_fts.rank"
+
+    @staticmethod
+    def rebuild_search_index():
+        return "INSERT INTO Books_fts (Books_fts) VALUES ('rebuild')"
+
+    @staticmethod
+    def get_books_matching_search_with_total(columns=None):
+        return f"SELECT {BookDaoQueries.select_list(columns)}, COUNT(*) OVER () AS match_total " \
+               "FROM Books JOIN Books_fts ON Books_fts.rowid = Books.id WHERE Books_fts MATCH ?"
+
+    @staticmethod
+    def get_book_columns_by_id(columns):
+        return f"SELECT {BookDaoQueries.select_list(columns)} FROM Books WHERE id = ?"
+
+    @staticmethod
+    def get_existing_isbns(count):
+        return "SELECT isbn FROM Books WHERE isbn IN (" + ", ".join("?" * count) + ")"
@@ -1,4 +1,8 @@
 class LoanDaoQueries:
+    COLUMNS = ('id', 'book_id', 'member_id', 'loan_date', 'return_date', 'fine', 'actual_return_date')
+    FINE = "CASE WHEN actual_return_date > return_date " \
+           "THEN CAST(julianday(actual_return_date) - julianday(return_date) AS INTEGER) * ? ELSE 0 END AS fine"
+
     @staticmethod
     def insert_new_loan():
         return "INSERT INTO Loan (book_id, member_id, loan_date,return_date) VALUES (?, ?, ?,?)"
@@ -20,3 +24,22 @@ class LoanDaoQueries:
     def delete_loan_by_id():
         return "DELETE FROM Loan WHERE id = ?"
 
+    @staticmethod
+    def get_all_loans_with_fine(columns=None):
+        # Same columns as SELECT * FROM Loan, with fine derived from the overdue days; when fine is
+        # selected, the fine rate is the first parameter
+        columns = LoanDaoQueries.COLUMNS if columns is None else columns
+        select_list = ", ".join(LoanDaoQueries.FINE if column == 'fine' else column for column in columns)
+        return f"SELECT {select_list} FROM Loan"
+
+    @staticmethod
+    def get_loan_by_id_with_fine():
+        return LoanDaoQueries.get_all_loans_with_fine() + " WHERE id = ?"
+
+    @staticmethod
+    def get_loan_columns_by_id(columns):
+        return f"SELECT {', '.join(columns)} FROM Loan WHERE id = ?"
+
+    @staticmethod
+    def count_loans():
+        return "SELECT COUNT(*) FROM Loan"
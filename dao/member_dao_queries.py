@@ -1,7 +1,19 @@
 class MemberDaoQueries:
+    COLUMNS = ('id', 'name', 'email', 'join_date')
+
+    @staticmethod
+    def get_all_members(columns=None):
+        if columns is None:
+            return "SELECT * FROM Members"
+        return f"SELECT {', '.join(columns)} FROM Members"
+
+    @staticmethod
+    def get_member_columns_by_id(columns):
+        return f"SELECT {', '.join(columns)} FROM Members WHERE id = ?"
+
     @staticmethod
-    def get_all_members():
-        return "SELECT * FROM Members"
+    def count_members():
+        return "SELECT COUNT(*) FROM Members"
 
     @staticmethod
     def get_member_by_id():
@@ -25,4 +37,4 @@ class MemberDaoQueries:
 
     @staticmethod
     def get_member_by_name():
-        return "SELECT * FROM Members WHERE name = ?"
+        return "SELECT * FROM Members WHERE name = ? COLLATE NOCASE"
@@ -0,0 +1,5 @@
+class TableVersionDaoQueries:
+    @staticmethod
+    def get_table_versions(count):
+        placeholders = ', '.join('?' * count)
+        return f"SELECT name, version FROM TableVersions WHERE name IN ({placeholders})"
@@ -1,14 +1,22 @@
 import logging
 import os
 
-from flask import Flask
-from flask_jwt_extended import JWTManager
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, jwt_required
 
+from config.instrumentation import METRICS_ENABLED
+from config.sqlite_config import create_tables, get_pool_stats
+from services.cache import get_cache_stats
+
+from controllers.api_docs import init_api_docs
 from controllers.book_controller import books_bp
+from controllers.compression import init_compression
+from controllers.errors import init_error_handlers
 from controllers.loan_controller import loans_bp
 from controllers.member_controller import members_bp
+from controllers.request_metrics import init_request_metrics
+from controllers.serialization import JSONEncoder
 from controllers.user_controller import auth_bp
-from flasgger import Swagger
 
 # Flask constructor takes the name of 
 # current module (__name__) as argument.
@@ -16,16 +24,24 @@ app = Flask(__name__)
 SECRET_KEY = os.environ.get('SECRET_KEY', 'my_precious')
 
 app.config['SECRET_KEY'] = SECRET_KEY
+app.json_encoder = JSONEncoder
 jwt = JWTManager(app)
 app.logger.setLevel('DEBUG')
-swagger = Swagger(app)
 logging.basicConfig(level=logging.INFO,  # Set to INFO to capture INFO logs and above
                     format='%(asctime)s - %(levelname)s - %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S')
+create_tables()
 app.register_blueprint(auth_bp, url_prefix='/auth')
 app.register_blueprint(books_bp, url_prefix='/api')
 app.register_blueprint(members_bp, url_prefix='/api')
 app.register_blueprint(loans_bp, url_prefix='/api')
+init_error_handlers(app)
+# None when SWAGGER_ENABLED is off
+swagger = init_api_docs(app)
+if METRICS_ENABLED:
+    init_request_metrics(app)
+# After the metrics hooks, so response byte counts are of the compressed body
+init_compression(app)
 
 
 # The route() function of the Flask class is a decorator,
@@ -36,6 +52,18 @@ def hello_world():
     return 'Hello World'
 
 
+@app.route('/db/pool', methods=['GET'])
+@jwt_required()
+def db_pool_stats():
+    return jsonify(get_pool_stats())
+
+
+@app.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    return jsonify(get_cache_stats())
+
+
 # main driver function
 if __name__ == '__main__':
     # run() method of Flask class runs the application
@@ -1,4 +1,6 @@
-
+-- Tables from before migrations were versioned. Every migration is written to be
+-- idempotent, so databases created by the old create_tables (user_version 0)
+-- are brought up to date in place.
 CREATE TABLE IF NOT EXISTS Members (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL ,
@@ -39,5 +41,3 @@ CREATE TABLE IF NOT EXISTS Users (
     role TEXT NOT NULL,
     FOREIGN KEY (member_id) REFERENCES Member(id)
 );
-
-
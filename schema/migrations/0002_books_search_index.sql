@@ -0,0 +1,35 @@
+-- Full-text index over the searchable Books columns. It is an external content
+-- table, so the text lives only in Books and the triggers below keep it in sync.
+CREATE VIRTUAL TABLE IF NOT EXISTS Books_fts USING fts5(
+    title,
+    author,
+    isbn,
+    language,
+    content='Books',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+-- Rank matches with bm25 weighted by column: title, author, isbn, language
+INSERT INTO Books_fts (Books_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 1.0)');
+
+CREATE TRIGGER IF NOT EXISTS Books_fts_after_insert AFTER INSERT ON Books BEGIN
+    INSERT INTO Books_fts (rowid, title, author, isbn, language)
+    VALUES (new.id, new.title, new.author, new.isbn, new.language);
+END;
+
+CREATE TRIGGER IF NOT EXISTS Books_fts_after_delete AFTER DELETE ON Books BEGIN
+    INSERT INTO Books_fts (Books_fts, rowid, title, author, isbn, language)
+    VALUES ('delete', old.id, old.title, old.author, old.isbn, old.language);
+END;
+
+CREATE TRIGGER IF NOT EXISTS Books_fts_after_update AFTER UPDATE OF title, author, isbn, language ON Books BEGIN
+    INSERT INTO Books_fts (Books_fts, rowid, title, author, isbn, language)
+    VALUES ('delete', old.id, old.title, old.author, old.isbn, old.language);
+    INSERT INTO Books_fts (rowid, title, author, isbn, language)
+    VALUES (new.id, new.title, new.author, new.isbn, new.language);
+END;
+
+-- Index the books that existed before the search index did
+INSERT INTO Books_fts (Books_fts) VALUES ('rebuild');
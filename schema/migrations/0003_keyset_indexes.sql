@@ -0,0 +1,15 @@
+-- Keyset pagination indexes for GET /api/books, one per supported sort key with
+-- id as the tie-breaker so page boundaries are stable.
+CREATE INDEX IF NOT EXISTS idx_books_published_date_id ON Books (published_date, id);
+CREATE INDEX IF NOT EXISTS idx_books_title_id ON Books (title, id);
+CREATE INDEX IF NOT EXISTS idx_books_author_id ON Books (author, id);
+-- Author filter combined with the default published_date ordering
+CREATE INDEX IF NOT EXISTS idx_books_author_published_date_id ON Books (author, published_date, id);
+
+-- GET /api/loans filters, each ordered by the (loan_date, id) keyset
+CREATE INDEX IF NOT EXISTS idx_loan_loan_date_id ON Loan (loan_date, id);
+CREATE INDEX IF NOT EXISTS idx_loan_member_id_loan_date_id ON Loan (member_id, loan_date, id);
+CREATE INDEX IF NOT EXISTS idx_loan_book_id_loan_date_id ON Loan (book_id, loan_date, id);
+-- Active and overdue loans are a small slice of all loans, so only they are indexed by due date
+CREATE INDEX IF NOT EXISTS idx_loan_active_return_date ON Loan (return_date) WHERE actual_return_date IS NULL;
+CREATE INDEX IF NOT EXISTS idx_loan_active_loan_date_id ON Loan (loan_date, id) WHERE actual_return_date IS NULL;
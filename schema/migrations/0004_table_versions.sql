@@ -0,0 +1,44 @@
+-- Per-table change counters. List ETags are derived from these, so a conditional
+-- GET only has to read one small row instead of running the list query.
+CREATE TABLE IF NOT EXISTS TableVersions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO TableVersions (name) VALUES ('Books'), ('Members'), ('Loan');
+
+CREATE TRIGGER IF NOT EXISTS Books_version_after_insert AFTER INSERT ON Books BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Books_version_after_update AFTER UPDATE ON Books BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Books_version_after_delete AFTER DELETE ON Books BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Books';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Members_version_after_insert AFTER INSERT ON Members BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Members';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Members_version_after_update AFTER UPDATE ON Members BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Members';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Members_version_after_delete AFTER DELETE ON Members BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Members';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Loan_version_after_insert AFTER INSERT ON Loan BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Loan';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Loan_version_after_update AFTER UPDATE ON Loan BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Loan';
+END;
+
+CREATE TRIGGER IF NOT EXISTS Loan_version_after_delete AFTER DELETE ON Loan BEGIN
+    UPDATE TableVersions SET version = version + 1 WHERE name = 'Loan';
+END;
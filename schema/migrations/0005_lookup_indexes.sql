@@ -0,0 +1,6 @@
+-- Member lookups by exact email and by case-insensitive name prefix
+CREATE INDEX IF NOT EXISTS idx_members_email ON Members (email);
+CREATE INDEX IF NOT EXISTS idx_members_name_nocase_id ON Members (name COLLATE NOCASE, id);
+
+-- UserDaoQueries.get_user_by_member_id
+CREATE INDEX IF NOT EXISTS idx_users_member_id ON Users (member_id);
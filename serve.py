@@ -0,0 +1,324 @@
+"""Pre-fork production server for the API.
+
+    python serve.py --bind 0.0.0.0:9090 --workers 4 --max-requests 10000
+
+The master process imports the app once (running migrations), renders the Swagger spec and
+freezes the heap. Then it forks the workers, which share all of that memory copy-on-write and
+accept connections from one listening socket. Each worker opens its own connection pool on the
+WAL database and serves requests with a threaded WSGI server.
+
+Signals to the master:
+
+- ``TERM`` / ``INT``: stop accepting connections, let in-flight requests finish (up to
+  --graceful-timeout) and exit.
+- ``HUP``: graceful reload. The master re-executes itself, keeping the listening socket, so
+  new code and settings are loaded. It starts a new set of workers and then retires the old
+  ones, so no connection is refused.
+- ``TTIN`` / ``TTOU``: add or remove a worker.
+
+A worker that has served --max-requests requests (plus a random jitter, so they do not all
+restart at once) finishes its in-flight requests and is replaced, which bounds slow leaks and
+cache growth.
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer
+
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+# Requests a worker serves before it is replaced; 0 keeps workers forever
+WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 0))
+WEB_GRACEFUL_TIMEOUT = float(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+WEB_BACKLOG = int(os.environ.get('WEB_BACKLOG', 2048))
+
+# Set across a HUP re-exec: the inherited listening socket and the workers it should retire
+LISTEN_FD_ENV = 'SERVE_LISTEN_FD'
+OLD_WORKERS_ENV = 'SERVE_OLD_WORKERS'
+
+# Worker exit code for "replaced after --max-requests", as opposed to a crash
+EXIT_RECYCLED = 0
+# Workers that die this soon after starting are respawned with a delay, so a broken deploy does not fork-bomb
+MIN_WORKER_LIFETIME = 1.0
+
+
+class Arbiter:
+    """Master process: keeps ``workers`` worker processes alive and reacts to signals."""
+
+    def __init__(self, app, listener, workers, max_requests, max_requests_jitter, graceful_timeout):
+        self.app = app
+        self.listener = listener
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        # pid -> start time of the current workers, and of workers being shut down
+        self.workers = {}
+        self.retiring = {}
+        self.stop_deadline = None
+        self._signals = []
+        self._wakeup_read, self._wakeup_write = os.pipe()
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, self._queue_signal)
+        os.set_blocking(self._wakeup_write, False)
+        signal.set_wakeup_fd(self._wakeup_write)
+        logging.info(f"Master {os.getpid()} listening on {_address(self.listener)} with {self.worker_count} workers")
+
+        self._spawn_missing()
+        inherited = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+        for pid in inherited:
+            # Workers of the master image that re-executed into this one; they are still our children
+            self.retiring[pid] = time.monotonic()
+            _kill(pid, signal.SIGTERM)
+
+        while self.workers or self.retiring or self.stop_deadline is None:
+            self._wait(1.0)
+            for sig in self._take_signals():
+                self._handle(sig)
+            self._reap()
+            if self.stop_deadline is None:
+                self._spawn_missing()
+            self._kill_overdue()
+        logging.info(f"Master {os.getpid()} stopped")
+
+    def _handle(self, sig):
+        if sig in (signal.SIGTERM, signal.SIGINT):
+            self.stop()
+        elif sig == signal.SIGHUP and self.stop_deadline is None:
+            self.reload()
+        elif sig == signal.SIGTTIN:
+            self.worker_count += 1
+        elif sig == signal.SIGTTOU and self.worker_count > 1:
+            self.worker_count -= 1
+            pid = max(self.workers, key=self.workers.get)
+            self._retire(pid)
+
+    def stop(self):
+        if self.stop_deadline is not None:
+            return
+        logging.info(f"Master {os.getpid()} stopping; waiting up to {self.graceful_timeout:g}s for requests")
+        self.stop_deadline = time.monotonic() + self.graceful_timeout
+        for pid in list(self.workers):
+            self._retire(pid)
+
+    def reload(self):
+        logging.info(f"Master {os.getpid()} reloading")
+        os.set_inheritable(self.listener.fileno(), True)
+        environ = dict(os.environ)
+        environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in list(self.workers) + list(self.retiring))
+        signal.set_wakeup_fd(-1)
+        os.execve(sys.executable, [sys.executable] + sys.argv, environ)
+
+    def _retire(self, pid):
+        self.retiring[pid] = time.monotonic()
+        self.workers.pop(pid, None)
+        _kill(pid, signal.SIGTERM)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            code = _exit_code(status)
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            if code == EXIT_RECYCLED:
+                logging.info(f"Worker {pid} recycled")
+            else:
+                logging.error(f"Worker {pid} exited with code {code}")
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+
+    def _spawn_missing(self):
+        while len(self.workers) < self.worker_count:
+            self._spawn()
+
+    def _spawn(self):
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return
+        code = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup_read)
+            os.close(self._wakeup_write)
+            Worker(self.app, self.listener, max_requests).run()
+            code = EXIT_RECYCLED
+        except BaseException:
+            logging.exception(f"Worker {os.getpid()} failed")
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, retired_at in list(self.retiring.items()):
+            if now - retired_at > self.graceful_timeout:
+                logging.warning(f"Worker {pid} did not stop within {self.graceful_timeout:g}s; killing it")
+                _kill(pid, signal.SIGKILL)
+                # Reaped by the next _reap; keep it from being killed again every second
+                self.retiring[pid] = float('inf')
+
+    def _queue_signal(self, sig, frame):
+        self._signals.append(sig)
+
+    def _take_signals(self):
+        signals, self._signals = self._signals, []
+        return signals
+
+    def _wait(self, timeout):
+        try:
+            ready, _, _ = select.select([self._wakeup_read], [], [], timeout)
+        except InterruptedError:
+            return
+        if ready:
+            try:
+                os.read(self._wakeup_read, 64)
+            except BlockingIOError:
+                pass
+
+
+class Worker:
+    """One forked process serving requests from the shared socket until told to stop or recycled."""
+
+    def __init__(self, app, listener, max_requests):
+        self.app = app
+        self.listener = listener
+        self.max_requests = max_requests
+        self.handled = 0
+        self.server = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def run(self):
+        from config.sqlite_config import configure_pool
+
+        # The master handles interrupts and reloads; workers only react to TERM from it
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTTIN, signal.SIG_IGN)
+        signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, lambda sig, frame: self.stop())
+        # SQLite connections must not be shared across fork; open this worker's own
+        configure_pool()
+
+        host, port = _address(self.listener).rsplit(':', 1)
+        self.server = ThreadedWSGIServer(host, int(port), self._count_requests, fd=self.listener.fileno())
+        # Let in-flight requests finish on shutdown instead of dying with the process
+        self.server.daemon_threads = False
+        self.server.block_on_close = True
+        logging.info(f"Worker {os.getpid()} started")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+        logging.info(f"Worker {os.getpid()} stopped after {self.handled} requests")
+
+    def stop(self):
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+        # shutdown() waits for serve_forever(), which may be running in the calling thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def _count_requests(self, environ, start_response):
+        with self._lock:
+            self.handled += 1
+            recycle = self.max_requests and self.handled == self.max_requests
+        if recycle:
+            self.stop()
+        return self.app(environ, start_response)
+
+
+def _kill(pid, sig):
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def _exit_code(status):
+    """The child's exit code, or minus the signal that killed it (os.waitstatus_to_exitcode needs Python 3.9)."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _address(listener):
+    host, port = listener.getsockname()[:2]
+    return f"{host}:{port}"
+
+
+def open_listener(bind, backlog):
+    inherited = os.environ.pop(LISTEN_FD_ENV, None)
+    if inherited:
+        listener = socket.socket(fileno=int(inherited))
+    else:
+        host, _, port = bind.rpartition(':')
+        listener = socket.create_server((host or '0.0.0.0', int(port)), backlog=backlog)
+    os.set_inheritable(listener.fileno(), False)
+    return listener
+
+
+def preload():
+    """Import the app and build everything workers can share before they are forked."""
+    from config import sqlite_config
+    from controllers.api_docs import render_spec
+    from main import app, swagger
+    from services.cache import share_invalidations
+
+    if swagger is not None:
+        # Workers inherit the serialized spec instead of each building it
+        for spec in swagger.config['specs']:
+            render_spec(app, swagger, spec['endpoint'])
+    # A write in one worker must invalidate the caches of all of them
+    share_invalidations()
+    # Forked children must not inherit open SQLite connections
+    sqlite_config.pool.close()
+    # Objects that exist now are never collected, so the collector does not dirty the shared pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=os.environ.get('WEB_BIND', '0.0.0.0:9090'), help='host:port')
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS)
+    parser.add_argument('--max-requests', type=int, default=WEB_MAX_REQUESTS)
+    parser.add_argument('--max-requests-jitter', type=int, default=WEB_MAX_REQUESTS_JITTER)
+    parser.add_argument('--graceful-timeout', type=float, default=WEB_GRACEFUL_TIMEOUT)
+    parser.add_argument('--backlog', type=int, default=WEB_BACKLOG)
+    args = parser.parse_args()
+
+    listener = open_listener(args.bind, args.backlog)
+    app = preload()
+    Arbiter(app, listener, args.workers, args.max_requests, args.max_requests_jitter, args.graceful_timeout).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Awaitable versions of the services for asyncio code such as the ASGI app.
+
+SQLite has no asynchronous interface, so each call runs the synchronous service method on a
+bounded thread pool while the event loop keeps serving other connections. Streaming methods
+resolve to async iterators that fetch one item at a time on the same pool.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from config.sqlite_config import DB_POOL_SIZE
+from services.auth_service import AuthService
+from services.book_service import BookService
+from services.loan_service import LoanService
+from services.member_service import MemberService
+from services.version_service import VersionService
+
+# Threads for blocking service calls. Twice the connection pool, so requests waiting on
+# password hashing or the write lock do not leave pooled connections idle
+SERVICE_WORKERS = int(os.environ.get('SERVICE_WORKERS', 2 * DB_POOL_SIZE))
+
+executor = ThreadPoolExecutor(max_workers=SERVICE_WORKERS, thread_name_prefix='service')
+
+_END = object()
+
+
+async def run_blocking(function, *args, context=None, **kwargs):
+    """Run ``function`` on the service thread pool and await its result.
+
+    Calls that belong to one request should share a ``contextvars.Context`` so state set in
+    one call, such as the Flask request context or per-request SQL stats, is seen by the next
+    even when it lands on another thread. By default a copy of the caller's context is used.
+    """
+    context = context or contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(context.run, function, *args, **kwargs))
+
+
+async def iterate_blocking(iterable, context=None):
+    """Async iterator over a blocking iterable; each item is produced on the service thread pool."""
+    context = context or contextvars.copy_context()
+    iterator = await run_blocking(iter, iterable, context=context)
+    try:
+        while True:
+            item = await run_blocking(next, iterator, _END, context=context)
+            if item is _END:
+                break
+            yield item
+    finally:
+        # Lets the iterator run its cleanup, e.g. a generator's finally blocks, on the service threads
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await run_blocking(close, context=context)
+
+
+def _offload(method):
+    @functools.wraps(method)
+    async def call(*args, **kwargs):
+        return await run_blocking(method, *args, **kwargs)
+    return staticmethod(call)
+
+
+def _offload_stream(method):
+    @functools.wraps(method)
+    async def call(*args, **kwargs):
+        context = contextvars.copy_context()
+        # Arguments are validated when the method is called, before any row is read
+        items = await run_blocking(method, *args, context=context, **kwargs)
+        return iterate_blocking(items, context)
+    return staticmethod(call)
+
+
+class AsyncBookService:
+    create_book = _offload(BookService.create_book)
+    get_books = _offload(BookService.get_books)
+    stream_books = _offload_stream(BookService.stream_books)
+    get_book = _offload(BookService.get_book)
+    get_book_versioned = _offload(BookService.get_book_versioned)
+    update_book = _offload(BookService.update_book)
+    delete_book = _offload(BookService.delete_book)
+    import_books = _offload(BookService.import_books)
+
+
+class AsyncMemberService:
+    get_members = _offload(MemberService.get_members)
+    stream_members = _offload_stream(MemberService.stream_members)
+    get_member_by_id = _offload(MemberService.get_member_by_id)
+    get_member_versioned = _offload(MemberService.get_member_versioned)
+    update_member = _offload(MemberService.update_member)
+    delete_member = _offload(MemberService.delete_member)
+
+
+class AsyncLoanService:
+    create_loan = _offload(LoanService.create_loan)
+    get_loans = _offload(LoanService.get_loans)
+    stream_loans = _offload_stream(LoanService.stream_loans)
+    get_loan = _offload(LoanService.get_loan)
+    get_loan_versioned = _offload(LoanService.get_loan_versioned)
+    update_loan = _offload(LoanService.update_loan)
+    delete_loan = _offload(LoanService.delete_loan)
+
+
+class AsyncAuthService:
+    register = _offload(AuthService.register)
+    login = _offload(AuthService.login)
+    refresh = _offload(AuthService.refresh)
+    get_stats = _offload(AuthService.get_stats)
+
+
+class AsyncVersionService:
+    get_table_versions = _offload(VersionService.get_table_versions)
@@ -1,48 +1,97 @@
 import logging
 
-from flask_jwt_extended import create_access_token
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask_jwt_extended import create_access_token, create_refresh_token
 
-from config.sqlite_config import get_db_connection
+from config.sqlite_config import db_connection
 from dao.member_dao_queries import MemberDaoQueries
 from dao.user_dao_queries import UserDaoQueries
+from services.cache import member_count_cache
+from services.metrics import counter, summarize_histogram
+from services.password_hashing import PasswordHashingBusyError, hash_password, hash_pending, hash_rejections, \
+    hash_seconds, hash_wait_seconds, verify_password
+
+logins = counter('auth_logins_total', 'Login attempts by result', ('result',))
+token_refreshes = counter('auth_token_refreshes_total', 'Access token refreshes by result', ('result',))
 
 
 class AuthService:
     @staticmethod
     def register(name, email, password, join_date, role, current_user_email):
         logging.info(f"User {current_user_email} is trying to register a new user")
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_connection() as conn:
+            cursor = conn.cursor()
 
-        # Check if a user with the provided email already exists
-        cursor.execute(UserDaoQueries.get_user_by_email(), (email,))
-        existing_user = cursor.fetchone()
+            # Check if a user with the provided email already exists
+            cursor.execute(UserDaoQueries.get_user_by_email(), (email,))
+            existing_user = cursor.fetchone()
 
         if existing_user:
             return {"message": "User with this email already exists"}, 400
 
-        cursor.execute(MemberDaoQueries.insert_new_member(), (name, email, join_date))
-        member_id = cursor.lastrowid
+        # Hash before writing: the hash may wait for a pool slot, and no connection or write lock is held meanwhile
+        try:
+            password_hash = hash_password(password)
+        except PasswordHashingBusyError:
+            return {"message": "Server is busy, please retry shortly"}, 503
 
-        password_hash = generate_password_hash(password)
-        cursor.execute(UserDaoQueries.insert_new_user(), (member_id, email, password_hash, role))
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(MemberDaoQueries.insert_new_member(), (name, email, join_date))
+            member_id = cursor.lastrowid
+            cursor.execute(UserDaoQueries.insert_new_user(), (member_id, email, password_hash, role))
 
-        conn.commit()
-        conn.close()
+            conn.commit()
+        member_count_cache.clear()
 
         return {"message": "User registered successfully by " + current_user_email + " as " + role + " role"}, 201
 
     @staticmethod
     def login(email, password):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(UserDaoQueries.get_user_by_email(), (email,))
-        user = cursor.fetchone()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(UserDaoQueries.get_user_by_email(), (email,))
+            user = cursor.fetchone()
+
+        try:
+            valid = user is not None and verify_password(user['password_hash'], password)
+        except PasswordHashingBusyError:
+            logins.inc('busy')
+            logging.warning(f"Login for {email} refused, password check pool is saturated")
+            return {"message": "Too many login attempts in progress, please retry shortly"}, 503
 
-        if user and check_password_hash(user['password_hash'], password):
+        if valid:
+            logins.inc('success')
             additional_claims = {"role": user['role']}
             access_token = create_access_token(identity=user['email'], additional_claims=additional_claims)
-            return {"access_token": access_token},200
+            refresh_token = create_refresh_token(identity=user['email'], additional_claims=additional_claims)
+            return {"access_token": access_token, "refresh_token": refresh_token}, 200
         else:
+            logins.inc('invalid')
             return {"message": "Invalid credentials"}, 401
+
+    @staticmethod
+    def refresh(email):
+        """Issue a new access token for a refresh token's user without checking the password again."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(UserDaoQueries.get_user_by_email(), (email,))
+            user = cursor.fetchone()
+
+        # Re-read the user so deactivations and role changes apply at the next refresh
+        if not user or not user['is_active']:
+            token_refreshes.inc('rejected')
+            return {"message": "User is no longer active"}, 401
+        token_refreshes.inc('success')
+        access_token = create_access_token(identity=user['email'], additional_claims={"role": user['role']})
+        return {"access_token": access_token}, 200
+
+    @staticmethod
+    def get_stats():
+        return {
+            "logins": {result: logins.value(result) for result in ('success', 'invalid', 'busy')},
+            "token_refreshes": {result: token_refreshes.value(result) for result in ('success', 'rejected')},
+            "password_hash_seconds": summarize_histogram(hash_seconds, 'verify'),
+            "password_hash_wait_seconds": summarize_histogram(hash_wait_seconds, 'verify'),
+            "password_hash_rejected": hash_rejections.value('verify'),
+            "password_hash_pending": hash_pending.value(),
+        }
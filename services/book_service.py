@@ -1,98 +1,418 @@
+import re
+from array import array
+from datetime import datetime
+
 from flask import url_for
-from config.sqlite_config import get_db_connection
+from config.sqlite_config import db_connection, stream_pages, write_transaction
 from dao.book_dao_queries import BookDaoQueries
+from services.cache import MISSING, book_cache, book_count_cache, read_through
+from services.fieldsets import project, select_columns, with_columns
+from services.pagination import COUNT_ESTIMATE, COUNT_EXACT, COUNT_NONE, InvalidPageRequestError, decode_cursor, \
+    encode_cursor
+
+SEARCH_TERM = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 16
+SEARCH_SORT = 'relevance'
+
+ESTIMATE_COUNT_CAP = 1000
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_REQUIRED_FIELDS = ('title', 'author', 'published_date', 'isbn', 'number_of_pages', 'language',
+                          'available_copies')
+MAX_REPORTED_IMPORT_ERRORS = 1000
 
 
 class BookService:
+
+    SORT_KEYS = ('published_date', 'title', 'author', 'id')
+    FIELDS = BookDaoQueries.COLUMNS
+    COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
     @staticmethod
     def create_book(data):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(BookDaoQueries.insert_new_book(), (data['title'], data['author'], data['published_date'],
-                                                          data['isbn'], data['number_of_pages'], data['cover_image'],
-                                                          data['language'], data['available_copies']))
-        conn.commit()
-        book_id = cursor.lastrowid
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(BookDaoQueries.insert_new_book(), (data['title'], data['author'], data['published_date'],
+                                                              data['isbn'], data['number_of_pages'], data['cover_image'],
+                                                              data['language'], data['available_copies']))
+            conn.commit()
+            book_id = cursor.lastrowid
+        book_count_cache.clear()
         return {"message": "Book created successfully", "book_id": book_id}
 
     @staticmethod
-    def get_books(author=None, published_start=None, published_end=None, page=1, limit=10, search=None):
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    def get_books(author=None, published_start=None, published_end=None, page=1, limit=10, search=None,
+                  sort='published_date', after=None, count=COUNT_EXACT, fields=None):
+        """Return one page of books, the filtered total and a cursor for the next page (or None).
+
+        Pages are addressed by ``after`` (a cursor from the previous page) so that deep pages
+        seek through the sort index instead of skipping rows; ``page`` is still honoured for
+        the first request of a walk. Searches are always ordered by relevance.
+
+        ``count`` selects how the total is produced: ``exact`` (cached per filter until Books
+        changes), ``estimate`` (a cached exact total if there is one, otherwise matches are
+        counted up to ESTIMATE_COUNT_CAP) or ``none`` (total is None).
+
+        ``fields`` limits the columns read to those names (plus id); None reads every column.
+        """
+        sort = BookService._validate_sort(sort, search)
+        if count not in BookService.COUNT_MODES:
+            raise InvalidPageRequestError(f"Unsupported count mode '{count}'")
+        if limit < 1:
+            raise InvalidPageRequestError("limit must be at least 1")
+        columns = select_columns(fields, BookService.FIELDS)
+
+        filters = BookService._filter_books(author, published_start, published_end, search)
+        if filters is None:
+            return [], (None if count == COUNT_NONE else 0), None
+        conditions, params, match = filters
+
+        count_query = (BookDaoQueries.get_books_matching_search() if search else BookDaoQueries.get_all_books()) \
+            + BookService._where(conditions, search)
+        count_params = list(params)
+        count_key = (author or None, published_start or None, published_end or None, match)
+
+        # Add pagination: seek past the cursor position, fetching one extra row to detect a next page
+        order_by, offset = BookService._seek(sort, after, page, limit, conditions, params)
+
+        if search:
+            # Ranking already visits every match, so the total comes from the same pass as a window count
+            query = BookDaoQueries.get_books_matching_search_with_total(columns)
+        else:
+            query = BookDaoQueries.get_all_books(columns)
+        query += BookService._where(conditions, search)
+        page_query = query + f" ORDER BY {order_by} LIMIT ? OFFSET ?"
+        params.extend([limit + 1, offset])
+
+        # Taken before the page query, which may also produce the total
+        count_generation = book_count_cache.generation()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            # Execute the query
+            cursor.execute(page_query, params)
+            books = cursor.fetchall()
+            window_total = None
+            if books and 'match_total' in books[0].keys():
+                # Only search queries carry the window count; drop it from the rows they return
+                window_total = books[0]['match_total']
+                books = [dict(book) for book in books]
+                for book in books:
+                    del book['match_total']
+
+            total = None
+            if count != COUNT_NONE:
+                total = BookService._count_books(cursor, count, count_key, count_query, count_params,
+                                                 window_total, len(books), offset == 0 and not after, limit,
+                                                 count_generation)
+
+            last = books[limit - 1] if len(books) > limit else None
+            if last is not None and columns is not None and sort in BookService.FIELDS and sort not in columns:
+                # The next cursor needs the sort value the fieldset left out; read it for the last row only
+                cursor.execute(BookDaoQueries.get_book_columns_by_id(('id', sort)), (last['id'],))
+                last = cursor.fetchone()
+
+        next_cursor = None
+        if last is not None:
+            books = books[:limit]
+            next_cursor = BookService._next_cursor(sort, last, offset + limit)
+
+        return books, total, next_cursor
+
+    @staticmethod
+    def stream_books(author=None, published_start=None, published_end=None, search=None, sort='published_date',
+                     after=None, limit=None, fields=None):
+        """Return an iterator over every matching book (or the first ``limit``), read a page at a time.
+
+        Arguments are validated eagerly so errors surface before a streamed response starts.
+        """
+        sort = BookService._validate_sort(sort, search)
+        columns = select_columns(fields, BookService.FIELDS)
+        filters = BookService._filter_books(author, published_start, published_end, search)
+        if filters is None:
+            return iter(())
+        conditions, params, match = filters
+        if search:
+            read_page = BookService._search_page_reader(conditions, params, after, limit, columns)
+            after = 0
+        else:
+            # Each page seeks past the last row of the previous one, so its sort value is read even if not returned
+            read_columns = with_columns(columns, (sort,) if sort in BookService.FIELDS else (), BookService.FIELDS)
+            query = BookDaoQueries.get_all_books(read_columns)
+
+            def read_page(conn, page_after, size):
+                page_conditions, page_params = list(conditions), list(params)
+                order_by, offset = BookService._seek(sort, page_after, 1, 0, page_conditions, page_params)
+                books = conn.execute(query + BookService._where(page_conditions, search)
+                                     + f" ORDER BY {order_by} LIMIT ? OFFSET ?",
+                                     page_params + [size, offset]).fetchall()
+                return books, BookService._next_cursor(sort, books[-1], offset + len(books)) if books else None
+
+        return (dict(book) if columns is None else project(book, columns)
+                for book in stream_pages(read_page, after, limit))
+
+    @staticmethod
+    def _search_page_reader(conditions, params, after, limit, columns):
+        """``read_page`` for stream_pages that streams a search in relevance order from one ranking pass.
+
+        The first page ranks the ids of every match (from ``after``, up to ``limit``) and keeps them,
+        8 bytes each; every page then reads its rows by primary key. So the FTS match and bm25 sort
+        run once, not once per page, and writes between pages cannot move rows across page
+        boundaries. Books deleted meanwhile are left out, and books added are not included.
+        """
+        _, start = BookService._seek(SEARCH_SORT, after, 1, 0, [], [])
+        id_query = BookDaoQueries.get_book_ids_matching_search() + BookService._where(conditions, True) \
+            + f" ORDER BY {BookDaoQueries.search_rank()}, Books.id LIMIT ? OFFSET ?"
+        ranked_ids = None
+
+        def read_page(conn, position, size):
+            nonlocal ranked_ids
+            if ranked_ids is None:
+                ranked_ids = array('q', (row[0] for row in conn.execute(
+                    id_query, params + [-1 if limit is None else limit, start])))
+            books = []
+            while len(books) < size and position < len(ranked_ids):
+                ids = ranked_ids[position:position + size - len(books)]
+                position += len(ids)
+                rows = {book['id']: book for book in
+                        conn.execute(BookDaoQueries.get_books_by_ids(len(ids), columns), ids.tolist())}
+                books.extend(rows[book_id] for book_id in ids if book_id in rows)
+            return books, position
 
-        # Build the SQL query dynamically based on filters and search
-        query = BookDaoQueries.get_all_books()
+        return read_page
+
+    @staticmethod
+    def _next_cursor(sort, last, next_offset):
+        if sort == SEARCH_SORT:
+            # bm25 can only be evaluated while matching, so relevance pages carry their offset instead
+            return encode_cursor(sort, [next_offset])
+        if sort == 'id':
+            return encode_cursor(sort, [last['id']])
+        return encode_cursor(sort, [last[sort], last['id']])
+
+    @staticmethod
+    def _validate_sort(sort, search):
+        if search:
+            return SEARCH_SORT
+        if sort not in BookService.SORT_KEYS:
+            raise InvalidPageRequestError(f"Unsupported sort key '{sort}'")
+        return sort
+
+    @staticmethod
+    def _filter_books(author, published_start, published_end, search):
+        """Build the WHERE conditions for the filters; None means the search cannot match anything."""
+        conditions = []
         params = []
+        match = None
+
+        if search:
+            match = BookService.build_search_expression(search)
+            if not match:
+                # Nothing searchable in the input (only punctuation), so nothing can match
+                return None
+            params.append(match)
 
         if author:
-            query += " WHERE author = ?"
+            conditions.append("Books.author = ?")
             params.append(author)
 
         if published_start:
-            if 'WHERE' in query:
-                query += " AND published_date >= ?"
-            else:
-                query += " WHERE published_date >= ?"
+            conditions.append("Books.published_date >= ?")
             params.append(published_start)
 
         if published_end:
-            if 'WHERE' in query:
-                query += " AND published_date <= ?"
-            else:
-                query += " WHERE published_date <= ?"
+            conditions.append("Books.published_date <= ?")
             params.append(published_end)
 
-        # Add search functionality
-        if search:
-            search_query = f"%{search}%"
-            if 'WHERE' in query:
-                query += " AND (title LIKE ? OR author LIKE ?)"
-            else:
-                query += " WHERE (title LIKE ? OR author LIKE ?)"
-            params.extend([search_query, search_query])
+        return conditions, params, match
 
-        # Add pagination
-        query += " ORDER BY published_date ASC LIMIT ? OFFSET ?"
-        params.extend([limit, (page - 1) * limit])
+    @staticmethod
+    def _seek(sort, after, page, limit, conditions, params):
+        """Add the keyset condition for ``after`` and return the ORDER BY clause and row offset."""
+        if sort == SEARCH_SORT:
+            # bm25 can only be evaluated while matching, so relevance pages carry their offset instead
+            offset = decode_cursor(after, sort, 1)[0] if after else (page - 1) * limit
+            if not isinstance(offset, int) or offset < 0:
+                raise InvalidPageRequestError("Malformed cursor")
+            return f"{BookDaoQueries.search_rank()}, Books.id", offset
 
-        # Execute the query
-        cursor.execute(query, params)
-        books = cursor.fetchall()
+        offset = 0 if after else (page - 1) * limit
+        if sort == 'id':
+            if after:
+                conditions.append("Books.id > ?")
+                params.extend(decode_cursor(after, sort, 1))
+            return "Books.id", offset
 
-        # Get the total number of books matching the filters and search (without pagination)
-        total_query = "SELECT COUNT(*) FROM (" + query.replace(" ORDER BY published_date ASC LIMIT ? OFFSET ?", "") + ")"
-        cursor.execute(total_query, params[:-2])  # Remove pagination params for count
-        total = cursor.fetchone()[0]
+        if after:
+            conditions.append(f"(Books.{sort}, Books.id) > (?, ?)")
+            params.extend(decode_cursor(after, sort, 2))
+        return f"Books.{sort}, Books.id", offset
 
-        conn.close()
-        return [dict(book) for book in books], total
+    @staticmethod
+    def _count_books(cursor, count, count_key, count_query, count_params, window_total, rows, first_page, limit,
+                     generation):
+        if window_total is not None:
+            total = window_total
+        elif first_page and rows <= limit:
+            # The whole result fits on the first page, so the page itself is the total
+            total = rows
+        else:
+            total = book_count_cache.get(count_key)
+            if total is not MISSING:
+                return total
+            if count == COUNT_ESTIMATE:
+                cursor.execute(f"SELECT COUNT(*) FROM ({count_query} LIMIT {ESTIMATE_COUNT_CAP})", count_params)
+                return cursor.fetchone()[0]
+            # Get the total number of books matching the filters and search (without pagination)
+            cursor.execute("SELECT COUNT(*) FROM (" + count_query + ")", count_params)
+            total = cursor.fetchone()[0]
+        book_count_cache.set(count_key, total, generation)
+        return total
+
+    @staticmethod
+    def _where(conditions, search):
+        if not conditions:
+            return ""
+        # The search query already has a WHERE clause for the MATCH
+        return (" AND " if search else " WHERE ") + " AND ".join(conditions)
+
+    @staticmethod
+    def build_search_expression(search):
+        """Turn free text into an FTS5 query where every word must match as a prefix."""
+        terms = SEARCH_TERM.findall(search.lower())[:MAX_SEARCH_TERMS]
+        return " ".join(f'"{term}"*' for term in terms)
 
     @staticmethod
     def get_book(book_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(BookDaoQueries.get_book_by_id(), (book_id,))
-        book = cursor.fetchone()
-        conn.close()
-        return dict(book) if book else None
+        return BookService.get_book_versioned(book_id)[0]
+
+    @staticmethod
+    def get_book_versioned(book_id):
+        def load():
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(BookDaoQueries.get_book_by_id(), (book_id,))
+                return cursor.fetchone()
+
+        return read_through(book_cache, book_id, load)
 
     @staticmethod
     def update_book(book_id, data):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(BookDaoQueries.update_book_by_id(), (data['title'], data['author'], data['published_date'],
-                                                            data['isbn'], data['number_of_pages'], data['cover_image'],
-                                                            data['language'], data['available_copies'], book_id))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(BookDaoQueries.update_book_by_id(), (data['title'], data['author'], data['published_date'],
+                                                                data['isbn'], data['number_of_pages'], data['cover_image'],
+                                                                data['language'], data['available_copies'], book_id))
+            conn.commit()
+        book_cache.delete(book_id)
+        book_count_cache.clear()
         return {"message": "Book updated successfully"}
 
     @staticmethod
     def delete_book(book_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(BookDaoQueries.delete_book_by_id(), (book_id,))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(BookDaoQueries.delete_book_by_id(), (book_id,))
+            conn.commit()
+        book_cache.delete(book_id)
+        book_count_cache.clear()
         return {"message": "Book deleted successfully"}
+
+    @staticmethod
+    def import_books(rows):
+        """Validate and insert uploaded book rows in batches, one short transaction per batch.
+
+        Invalid rows and ISBNs that already exist (in the database or earlier in the upload) are
+        reported by row number instead of aborting the upload. If ``rows`` raises ValueError
+        because the body is malformed, the rows read so far are kept and the error is reported.
+        Each batch borrows a pooled connection only while it is written, so a slow upload holds none.
+        """
+        summary = {"received": 0, "inserted": 0, "rejected": 0, "errors": [], "errors_truncated": False}
+        batch = []
+        rows = iter(rows)
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except ValueError as e:
+                summary["error"] = f"Stopped reading the upload after row {summary['received']}: {str(e)}"
+                break
+            summary["received"] += 1
+            row_number = summary["received"]
+            try:
+                batch.append((row_number, BookService._parse_import_row(row)))
+            except ValueError as e:
+                BookService._reject_import_row(summary, row_number, row, str(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                BookService._insert_import_batch(batch, summary)
+                batch = []
+        if batch:
+            BookService._insert_import_batch(batch, summary)
+        # Conflicts are only found when their batch is written, so put the report back in upload order
+        summary["errors"].sort(key=lambda error: error["row"])
+        return summary
+
+    @staticmethod
+    def _parse_import_row(row):
+        """Return the insert parameters for an uploaded row or raise ValueError describing the problem."""
+        if not isinstance(row, dict):
+            raise ValueError("Row must be an object")
+        missing = [field for field in IMPORT_REQUIRED_FIELDS if row.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+        published_date = str(row['published_date']).strip()
+        try:
+            datetime.strptime(published_date, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError("published_date must be a YYYY-MM-DD date")
+        counts = {}
+        for field in ('number_of_pages', 'available_copies'):
+            value = row[field]
+            try:
+                if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                    raise ValueError
+                counts[field] = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be an integer")
+            if counts[field] < 0:
+                raise ValueError(f"{field} must not be negative")
+        return (str(row['title']).strip(), str(row['author']).strip(), published_date, str(row['isbn']).strip(),
+                counts['number_of_pages'], row.get('cover_image') or None, str(row['language']).strip(),
+                counts['available_copies'])
+
+    @staticmethod
+    def _insert_import_batch(batch, summary):
+        def insert(conn):
+            # The write lock is taken before the ISBN check, so the check and the insert see the same data
+            existing = {row['isbn'] for row in conn.execute(BookDaoQueries.get_existing_isbns(len(batch)),
+                                                             [params[3] for _, params in batch])}
+            duplicates = []
+            new_books = []
+            for row_number, params in batch:
+                if params[3] in existing:
+                    duplicates.append((row_number, params[3]))
+                else:
+                    existing.add(params[3])
+                    new_books.append(params)
+            conn.executemany(BookDaoQueries.insert_new_book(), new_books)
+            return duplicates, len(new_books)
+
+        # Retried as a whole on SQLITE_BUSY, so the summary is only updated once the batch is committed
+        duplicates, inserted = write_transaction(insert)
+        for row_number, isbn in duplicates:
+            BookService._reject_import_row(summary, row_number, {"isbn": isbn}, "A book with this ISBN already exists")
+        summary["inserted"] += inserted
+        if inserted:
+            # Per batch, so totals are right even if a later batch fails
+            book_count_cache.clear()
+
+    @staticmethod
+    def _reject_import_row(summary, row_number, row, error):
+        summary["rejected"] += 1
+        if len(summary["errors"]) >= MAX_REPORTED_IMPORT_ERRORS:
+            summary["errors_truncated"] = True
+            return
+        isbn = row.get('isbn') if isinstance(row, dict) else None
+        summary["errors"].append({"row": row_number, "isbn": isbn, "error": error})
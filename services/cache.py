@@ -0,0 +1,202 @@
+import ctypes
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.sharedctypes import RawArray
+
+MISSING = object()
+
+ENTITY_CACHE_SIZE = int(os.environ.get('ENTITY_CACHE_SIZE', 2048))
+ENTITY_CACHE_TTL = float(os.environ.get('ENTITY_CACHE_TTL', 30))
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    The TTL bounds how stale an entry can get when a write happens in another
+    process that cannot invalidate this one. Processes forked after
+    share_invalidations() can: see share().
+    """
+
+    def __init__(self, max_entries=1024, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_loads = 0
+        # Bumped by every delete and clear, so a value loaded before an invalidation is not stored after it
+        self._generation = 0
+        # Shared-memory slot that delete and clear stamp in every process, and the last stamp this one saw
+        self._stamps = None
+        self._slot = None
+        self._seen_stamp = 0
+
+    def share(self, stamps, slot):
+        """Invalidate across forked processes through ``stamps[slot]``, a shared-memory integer.
+
+        delete() and clear() write a new stamp there after invalidating locally; every process
+        that finds a stamp it has not seen drops all its entries, since it cannot tell which keys
+        changed. Must be called before forking.
+        """
+        with self._lock:
+            self._stamps = stamps
+            self._slot = slot
+            self._seen_stamp = stamps[slot]
+
+    def _sync(self):
+        # Callers hold self._lock
+        if self._stamps is None:
+            return
+        stamp = self._stamps[self._slot]
+        if stamp != self._seen_stamp:
+            self._seen_stamp = stamp
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def _stamp(self):
+        # Callers hold self._lock. This process's own entries are dropped on its next access too,
+        # so a stamp another process wrote just before this one cannot be missed.
+        if self._stamps is not None:
+            self._stamps[self._slot] = _next_stamp()
+
+    def get(self, key):
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """Token to take before loading a value and pass to set(), which drops the value if an invalidation ran since."""
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            self._sync()
+            if generation is not None and generation != self._generation:
+                self.stale_loads += 1
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._stamp()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._stamp()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+                "shared": self._stamps is not None,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Stamps are unique across processes: this process's pid above a per-process counter
+_stamp_counter = itertools.count(1)
+
+
+def _next_stamp():
+    return (os.getpid() << 32) | (next(_stamp_counter) & 0xFFFFFFFF)
+
+
+def row_version(row):
+    """Fingerprint of a row's values; it changes whenever any column does, so it can back a strong ETag."""
+    return hashlib.blake2b(repr(tuple(row.values())).encode(), digest_size=8).hexdigest()
+
+
+def read_through(cache, key, load):
+    """Return ``(row, version)`` for ``key``, calling ``load()`` on a miss, or ``(None, None)`` if there is no row.
+
+    The row is a copy: callers add links to it, so the cached dict is never handed out. If the
+    key is invalidated while ``load()`` runs, the row is returned but not cached, since it may
+    predate the write that invalidated it.
+    """
+    entry = cache.get(key)
+    if entry is MISSING:
+        generation = cache.generation()
+        row = load()
+        if not row:
+            return None, None
+        row = dict(row)
+        entry = (row, row_version(row))
+        cache.set(key, entry, generation)
+    row, version = entry
+    return dict(row), version
+
+
+# Read-through caches for single-entity lookups, invalidated by every write path that changes the row
+book_cache = LRUCache(max_entries=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+member_cache = LRUCache(max_entries=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+loan_cache = LRUCache(max_entries=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+
+# Exact book totals per normalized filter; cleared on every write to Books
+book_count_cache = LRUCache(max_entries=1024, ttl=300)
+# Exact loan totals per filter; cleared on every write to Loan
+loan_count_cache = LRUCache(max_entries=1024, ttl=300)
+# Exact member totals per filter; cleared on every write to Members
+member_count_cache = LRUCache(max_entries=1024, ttl=300)
+
+CACHES = {
+    "books": book_cache,
+    "members": member_cache,
+    "loans": loan_cache,
+    "book_counts": book_count_cache,
+    "loan_counts": loan_count_cache,
+    "member_counts": member_count_cache,
+}
+
+
+def share_invalidations():
+    """Let every cache be invalidated across the processes forked after this call, e.g. serve.py workers."""
+    stamps = RawArray(ctypes.c_uint64, len(CACHES))
+    for slot, cache in enumerate(CACHES.values()):
+        cache.share(stamps, slot)
+
+
+def get_cache_stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,30 @@
+class InvalidFieldsError(ValueError):
+    pass
+
+
+def select_columns(fields, columns):
+    """Return the columns to read for the requested ``fields``, in table order, or None for all of them.
+
+    ``id`` is always read: links and cursors are built from it.
+    """
+    if fields is None:
+        return None
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}")
+    selected = tuple(column for column in columns if column == 'id' or column in fields)
+    return None if len(selected) == len(columns) else selected
+
+
+def with_columns(columns, required, all_columns):
+    """``columns`` plus any ``required`` column it leaves out, in table order; None (every column) stays None."""
+    if columns is None or all(column in columns for column in required):
+        return columns
+    return tuple(column for column in all_columns if column in columns or column in required)
+
+
+def project(row, columns):
+    """Keep only ``columns`` of an already loaded row, e.g. a cached single resource."""
+    if columns is None:
+        return row
+    return {column: row[column] for column in columns}
@@ -1,128 +1,250 @@
-from config.sqlite_config import get_db_connection
+from config.sqlite_config import db_connection, stream_pages, write_transaction
 from dao.book_dao_queries import BookDaoQueries
 from dao.loan_dao_queries import LoanDaoQueries
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from services.cache import MISSING, book_cache, loan_cache, loan_count_cache, read_through
+from services.fieldsets import project, select_columns, with_columns
+from services.pagination import COUNT_EXACT, COUNT_NONE, InvalidPageRequestError, decode_cursor, encode_cursor
+
+STATUS_ACTIVE = 'active'
+STATUS_RETURNED = 'returned'
+STATUS_OVERDUE = 'overdue'
+LOAN_SORT = 'loan_date'
 
 class LoanService:
 
     FINE_RATE = 30  # Fine of 30 rupees per day for overdue books
+    STATUSES = (STATUS_ACTIVE, STATUS_RETURNED, STATUS_OVERDUE)
+    FIELDS = LoanDaoQueries.COLUMNS
 
     @staticmethod
     def create_loan(data):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Check if the book is available
-        cursor.execute(BookDaoQueries.get_available_copies(), (data['book_id'],))
-        book = cursor.fetchone()
-
-        if book and book['available_copies'] > 0:
-            # Reduce available copies by 1
-            cursor.execute(BookDaoQueries.update_available_copies_when_loaned(), (data['book_id'],))
+        # Set return_date to 15 days after loan_date
+        loan_date = datetime.strptime(data['loan_date'], '%Y-%m-%d')
+        return_date = loan_date + timedelta(days=15)
+        loan = (data['book_id'], data['member_id'], data['loan_date'], return_date.strftime('%Y-%m-%d'))
 
-            # Set return_date to 15 days after loan_date
-            loan_date = datetime.strptime(data['loan_date'], '%Y-%m-%d')
-            return_date = loan_date + timedelta(days=15)
+        def checkout(conn):
+            # Reduce available copies by 1, only if a copy is available
+            cursor = conn.execute(BookDaoQueries.update_available_copies_when_loaned(), (data['book_id'],))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return None
 
             # Create loan record
-            cursor.execute(LoanDaoQueries.insert_new_loan(), (data['book_id'], data['member_id'],
-                                                              data['loan_date'], return_date.strftime('%Y-%m-%d')))
-            conn.commit()
-            loan_id = cursor.lastrowid
-            conn.close()
-            return {"message": "Loan created successfully", "loan_id": loan_id}, 201
-        else:
-            conn.close()
+            cursor.execute(LoanDaoQueries.insert_new_loan(), loan)
+            return cursor.lastrowid
+
+        loan_id = write_transaction(checkout)
+        if loan_id is None:
             return {"message": "Book not available"}, 400
+        book_cache.delete(int(data['book_id']))
+        loan_count_cache.clear()
+        return {"message": "Loan created successfully", "loan_id": loan_id}, 201
+
+    @staticmethod
+    def get_loans(member_id=None, book_id=None, status=None, loan_date_from=None, loan_date_to=None, limit=50,
+                  after=None, count=COUNT_EXACT, fields=None):
+        """Return one page of loans ordered by (loan_date, id), the filtered total and the next cursor.
+
+        ``status`` is one of ``active`` (not returned yet), ``returned`` or ``overdue`` (not returned
+        and past its return date). All filtering and paging happens in SQL on indexed columns.
+        Exact totals are cached per filter until Loan changes, so later pages do not count again.
+        ``fields`` limits the columns read to those names (plus id); None reads every column.
+        """
+        if count not in (COUNT_EXACT, COUNT_NONE):
+            raise InvalidPageRequestError(f"Unsupported count mode '{count}'")
+        if limit < 1:
+            raise InvalidPageRequestError("limit must be at least 1")
+        columns = select_columns(fields, LoanService.FIELDS)
+
+        conditions, params = LoanService._filter_loans(member_id, book_id, status, loan_date_from, loan_date_to)
+
+        count_query = LoanDaoQueries.count_loans() + LoanService._where(conditions)
+        count_params = list(params)
+        # The overdue filter compares against today's date, so its totals are kept per day
+        count_key = (member_id, book_id, status, loan_date_from or None, loan_date_to or None,
+                     date.today() if status == STATUS_OVERDUE else None)
+
+        if after:
+            conditions.append("(loan_date, id) > (?, ?)")
+            params.extend(decode_cursor(after, LOAN_SORT, 2))
+
+        # Fetch one extra row to find out whether there is a next page; fines are computed by the query
+        query = LoanDaoQueries.get_all_loans_with_fine(columns) + LoanService._where(conditions) \
+            + " ORDER BY loan_date, id LIMIT ?"
+        params = LoanService._fine_params(columns) + params + [limit + 1]
+
+        # Taken before the page query, which may also produce the total
+        count_generation = loan_count_cache.generation()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            loans = cursor.fetchall()
+
+            total = None
+            if count == COUNT_EXACT:
+                if not after and len(loans) <= limit:
+                    total = len(loans)
+                    loan_count_cache.set(count_key, total, count_generation)
+                else:
+                    total = loan_count_cache.get(count_key)
+                    if total is MISSING:
+                        cursor.execute(count_query, count_params)
+                        total = cursor.fetchone()[0]
+                        loan_count_cache.set(count_key, total, count_generation)
+
+            last = loans[limit - 1] if len(loans) > limit else None
+            if last is not None and columns is not None and LOAN_SORT not in columns:
+                # The next cursor needs the loan date the fieldset left out; read it for the last row only
+                cursor.execute(LoanDaoQueries.get_loan_columns_by_id(('id', LOAN_SORT)), (last['id'],))
+                last = cursor.fetchone()
+
+        next_cursor = None
+        if last is not None:
+            loans = loans[:limit]
+            next_cursor = encode_cursor(LOAN_SORT, [last[LOAN_SORT], last['id']])
+
+        # Rows, not dicts: the response encoder writes sqlite3.Row directly
+        return loans, total, next_cursor
 
     @staticmethod
-    def get_loans():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(LoanDaoQueries.get_all_loans())
-        loans = cursor.fetchall()
-        conn.close()
-
-        # Calculate fines for overdue loans
-        loans_with_fines = []
-        for loan in loans:
-            loan_dict = dict(loan)
-            loan_dict['fine'] = LoanService.calculate_fine(loan_dict['return_date'], loan_dict.get('actual_return_date'))
-            loans_with_fines.append(loan_dict)
-
-        return loans_with_fines
+    def stream_loans(member_id=None, book_id=None, status=None, loan_date_from=None, loan_date_to=None, after=None,
+                     limit=None, fields=None):
+        """Return an iterator over every matching loan (or the first ``limit``), read a page at a time."""
+        columns = select_columns(fields, LoanService.FIELDS)
+        conditions, params = LoanService._filter_loans(member_id, book_id, status, loan_date_from, loan_date_to)
+        # Each page seeks past the last loan of the previous one, so its loan date is read even if not returned
+        read_columns = with_columns(columns, (LOAN_SORT,), LoanService.FIELDS)
+        query = LoanDaoQueries.get_all_loans_with_fine(read_columns)
+        fine_params = LoanService._fine_params(read_columns)
+
+        def read_page(conn, page_after, size):
+            page_conditions, page_params = list(conditions), list(params)
+            if page_after:
+                page_conditions.append("(loan_date, id) > (?, ?)")
+                page_params.extend(decode_cursor(page_after, LOAN_SORT, 2))
+            loans = conn.execute(query + LoanService._where(page_conditions) + " ORDER BY loan_date, id LIMIT ?",
+                                 fine_params + page_params + [size]).fetchall()
+            return loans, encode_cursor(LOAN_SORT, [loans[-1][LOAN_SORT], loans[-1]['id']]) if loans else None
+
+        return (dict(loan) if columns is None else project(loan, columns)
+                for loan in stream_pages(read_page, after, limit))
+
+    @staticmethod
+    def _fine_params(columns):
+        # The fine rate is only bound when the fine column is selected
+        return [LoanService.FINE_RATE] if columns is None or 'fine' in columns else []
+
+    @staticmethod
+    def _filter_loans(member_id, book_id, status, loan_date_from, loan_date_to):
+        if status is not None and status not in LoanService.STATUSES:
+            raise InvalidPageRequestError(f"Unsupported loan status '{status}'")
+
+        conditions = []
+        params = []
+
+        if member_id is not None:
+            conditions.append("member_id = ?")
+            params.append(member_id)
+
+        if book_id is not None:
+            conditions.append("book_id = ?")
+            params.append(book_id)
+
+        if status == STATUS_RETURNED:
+            conditions.append("actual_return_date IS NOT NULL")
+        elif status in (STATUS_ACTIVE, STATUS_OVERDUE):
+            conditions.append("actual_return_date IS NULL")
+            if status == STATUS_OVERDUE:
+                conditions.append("return_date < ?")
+                params.append(date.today().strftime('%Y-%m-%d'))
+
+        if loan_date_from:
+            conditions.append("loan_date >= ?")
+            params.append(loan_date_from)
+
+        if loan_date_to:
+            conditions.append("loan_date <= ?")
+            params.append(loan_date_to)
+
+        return conditions, params
+
+    @staticmethod
+    def _where(conditions):
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
 
     @staticmethod
     def get_loan(loan_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(LoanDaoQueries.get_loan_by_id(), (loan_id,))
-        loan = cursor.fetchone()
-        conn.close()
-
-        if loan:
-            loan_dict = dict(loan)
-            loan_dict['fine'] = LoanService.calculate_fine(loan_dict['return_date'], loan_dict.get('actual_return_date'))
-            return loan_dict
-        else:
-            return None
+        return LoanService.get_loan_versioned(loan_id)[0]
+
+    @staticmethod
+    def get_loan_versioned(loan_id):
+        def load():
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(LoanDaoQueries.get_loan_by_id_with_fine(), (LoanService.FINE_RATE, loan_id))
+                return cursor.fetchone()
+
+        return read_through(loan_cache, loan_id, load)
 
     @staticmethod
     def update_loan(loan_id, data):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(LoanDaoQueries.get_loan_by_id(), (loan_id,))
-        loan = cursor.fetchone()
-
-        if loan:
-            # Validate return_date is after loan_date
-            if 'actual_return_date' in data and data['actual_return_date']:
-                actual_return_date = datetime.strptime(data['actual_return_date'], '%Y-%m-%d')
-                loan_date = datetime.strptime(loan['loan_date'], '%Y-%m-%d')
-                return_date = datetime.strptime(loan['return_date'], '%Y-%m-%d')
-
-                if actual_return_date < loan_date:
-                    conn.close()
-                    return {"message": "Actual return date must be after loan date"}, 400
-
-                # Calculate fine for the overdue book
-                fine = LoanService.calculate_fine(return_date.strftime('%Y-%m-%d'), data['actual_return_date'])
-
-                # Update loan record with actual return date and fine
-                cursor.execute(LoanDaoQueries.update_loan_by_id(), (data.get('actual_return_date'), fine, loan_id))
-                # Increment available copies by 1 if book is being returned
-                cursor.execute(BookDaoQueries.update_available_copies_when_returned(), (loan['book_id'],))
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(LoanDaoQueries.get_loan_by_id(), (loan_id,))
+            loan = cursor.fetchone()
 
-            else:
-                # If actual return date is not provided, just update other details
-                cursor.execute(LoanDaoQueries.update_loan_by_id(), (data.get('return_date'), 0 ,loan_id))
+            if loan:
+                # Validate return_date is after loan_date
+                if 'actual_return_date' in data and data['actual_return_date']:
+                    actual_return_date = datetime.strptime(data['actual_return_date'], '%Y-%m-%d')
+                    loan_date = datetime.strptime(loan['loan_date'], '%Y-%m-%d')
+                    return_date = datetime.strptime(loan['return_date'], '%Y-%m-%d')
+
+                    if actual_return_date < loan_date:
+                        return {"message": "Actual return date must be after loan date"}, 400
+
+                    # Calculate fine for the overdue book
+                    fine = LoanService.calculate_fine(return_date.strftime('%Y-%m-%d'), data['actual_return_date'])
+
+                    # Update loan record with actual return date and fine
+                    cursor.execute(LoanDaoQueries.update_loan_by_id(), (data.get('actual_return_date'), fine, loan_id))
+                    # Increment available copies by 1 if book is being returned
+                    cursor.execute(BookDaoQueries.update_available_copies_when_returned(), (loan['book_id'],))
 
-            conn.commit()
-            conn.close()
-            return {"message": "Loan updated successfully"}, 200
-        else:
-            conn.close()
-            return {"message": "Loan not found"}, 404
+                else:
+                    # If actual return date is not provided, just update other details
+                    cursor.execute(LoanDaoQueries.update_loan_by_id(), (data.get('return_date'), 0 ,loan_id))
+
+                conn.commit()
+                loan_cache.delete(loan_id)
+                loan_count_cache.clear()
+                book_cache.delete(loan['book_id'])
+                return {"message": "Loan updated successfully"}, 200
+            else:
+                return {"message": "Loan not found"}, 404
 
     @staticmethod
     def delete_loan(loan_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(LoanDaoQueries.get_loan_by_id(), (loan_id,))
-        loan = cursor.fetchone()
-
-        if loan:
-            # Increment available copies by 1 if the loan is being deleted and the book hasn't been returned
-            if not loan['return_date']:
-                cursor.execute(BookDaoQueries.update_available_copies_when_returned(), (loan['book_id'],))
-
-            cursor.execute(LoanDaoQueries.delete_loan_by_id(), (loan_id,))
-            conn.commit()
-            conn.close()
-            return {"message": "Loan deleted successfully"}, 200
-        else:
-            conn.close()
-            return {"message": "Loan not found"}, 404
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(LoanDaoQueries.get_loan_by_id(), (loan_id,))
+            loan = cursor.fetchone()
+
+            if loan:
+                # Increment available copies by 1 if the loan is being deleted and the book hasn't been returned
+                if not loan['return_date']:
+                    cursor.execute(BookDaoQueries.update_available_copies_when_returned(), (loan['book_id'],))
+
+                cursor.execute(LoanDaoQueries.delete_loan_by_id(), (loan_id,))
+                conn.commit()
+                loan_cache.delete(loan_id)
+                loan_count_cache.clear()
+                book_cache.delete(loan['book_id'])
+                return {"message": "Loan deleted successfully"}, 200
+            else:
+                return {"message": "Loan not found"}, 404
 
     @staticmethod
     def calculate_fine(return_date, actual_return_date):
@@ -1,41 +1,176 @@
 from flask import url_for
-from config.sqlite_config import get_db_connection
+from config.sqlite_config import db_connection, stream_pages
 from dao.member_dao_queries import MemberDaoQueries
+from services.cache import MISSING, member_cache, member_count_cache, read_through
+from services.fieldsets import project, select_columns, with_columns
+from services.pagination import COUNT_EXACT, COUNT_NONE, InvalidPageRequestError, decode_cursor, encode_cursor
+
+# Upper bound for a prefix range: sorts after any name that starts with the prefix
+PREFIX_END = '\U0010ffff'
 
 
 class MemberService:
+    FIELDS = MemberDaoQueries.COLUMNS
+    SORT_KEYS = ('id', 'name')
+
+    @staticmethod
+    def get_members(email=None, name=None, sort='id', limit=50, after=None, count=COUNT_EXACT, fields=None):
+        """Return one page of members, the filtered total and a cursor for the next page (or None).
+
+        ``email`` matches exactly and ``name`` matches a case-insensitive prefix; either is served
+        by its index, and a name search is always ordered by name. Pages are addressed by the
+        ``after`` cursor, so deep pages seek instead of skipping rows. Rows are ``sqlite3.Row``
+        objects; the response encoder writes them directly.
+
+        ``fields`` limits the columns read to those names (plus id); None reads every column.
+        Exact totals are cached per filter until Members changes, so later pages do not count again.
+        """
+        if count not in (COUNT_EXACT, COUNT_NONE):
+            raise InvalidPageRequestError(f"Unsupported count mode '{count}'")
+        if limit < 1:
+            raise InvalidPageRequestError("limit must be at least 1")
+        columns = select_columns(fields, MemberService.FIELDS)
+        sort = MemberService._validate_sort(sort, name)
+        conditions, params = MemberService._filter_members(email, name)
+
+        count_query = MemberDaoQueries.count_members() + MemberService._where(conditions)
+        count_params = list(params)
+        count_key = (email or None, name or None)
+
+        # Fetch one extra row to find out whether there is a next page
+        order_by = MemberService._seek(sort, after, conditions, params)
+        query = MemberDaoQueries.get_all_members(columns) + MemberService._where(conditions) \
+            + f" ORDER BY {order_by} LIMIT ?"
+        params.append(limit + 1)
+
+        # Taken before the page query, which may also produce the total
+        count_generation = member_count_cache.generation()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            members = cursor.fetchall()
+
+            total = None
+            if count == COUNT_EXACT:
+                if not after and len(members) <= limit:
+                    total = len(members)
+                    member_count_cache.set(count_key, total, count_generation)
+                else:
+                    total = member_count_cache.get(count_key)
+                    if total is MISSING:
+                        cursor.execute(count_query, count_params)
+                        total = cursor.fetchone()[0]
+                        member_count_cache.set(count_key, total, count_generation)
+
+            last = members[limit - 1] if len(members) > limit else None
+            if last is not None and columns is not None and sort not in columns:
+                # The next cursor needs the name the fieldset left out; read it for the last row only
+                cursor.execute(MemberDaoQueries.get_member_columns_by_id(('id', sort)), (last['id'],))
+                last = cursor.fetchone()
+
+        next_cursor = None
+        if last is not None:
+            members = members[:limit]
+            next_cursor = MemberService._next_cursor(sort, last)
+        return members, total, next_cursor
+
+    @staticmethod
+    def stream_members(email=None, name=None, sort='id', after=None, limit=None, fields=None):
+        """Return an iterator over every matching member (or the first ``limit``), read a page at a time."""
+        columns = select_columns(fields, MemberService.FIELDS)
+        sort = MemberService._validate_sort(sort, name)
+        conditions, params = MemberService._filter_members(email, name)
+        # Each page seeks past the last member of the previous one, so its sort value is read even if not returned
+        query = MemberDaoQueries.get_all_members(with_columns(columns, (sort,), MemberService.FIELDS))
+
+        def read_page(conn, page_after, size):
+            page_conditions, page_params = list(conditions), list(params)
+            order_by = MemberService._seek(sort, page_after, page_conditions, page_params)
+            members = conn.execute(query + MemberService._where(page_conditions) + f" ORDER BY {order_by} LIMIT ?",
+                                   page_params + [size]).fetchall()
+            return members, MemberService._next_cursor(sort, members[-1]) if members else None
+
+        return (dict(member) if columns is None else project(member, columns)
+                for member in stream_pages(read_page, after, limit))
+
     @staticmethod
-    def get_members():
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(MemberDaoQueries.get_all_members())
-        members = cursor.fetchall()
-        conn.close()
-        return [dict(member) for member in members]
+    def _next_cursor(sort, last):
+        if sort == 'id':
+            return encode_cursor(sort, [last['id']])
+        return encode_cursor(sort, [last[sort], last['id']])
+
+    @staticmethod
+    def _validate_sort(sort, name):
+        if name:
+            return 'name'
+        if sort not in MemberService.SORT_KEYS:
+            raise InvalidPageRequestError(f"Unsupported sort key '{sort}'")
+        return sort
+
+    @staticmethod
+    def _filter_members(email, name):
+        conditions = []
+        params = []
+
+        if email:
+            conditions.append("email = ?")
+            params.append(email)
+
+        if name:
+            # A range on idx_members_name_nocase_id; unlike LIKE, the input needs no wildcard escaping
+            conditions.append("name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE")
+            params.extend([name, name + PREFIX_END])
+
+        return conditions, params
+
+    @staticmethod
+    def _seek(sort, after, conditions, params):
+        """Add the keyset condition for ``after`` and return the ORDER BY clause."""
+        if sort == 'id':
+            if after:
+                conditions.append("id > ?")
+                params.extend(decode_cursor(after, sort, 1))
+            return "id"
+
+        if after:
+            conditions.append("(name, id) > (? COLLATE NOCASE, ?)")
+            params.extend(decode_cursor(after, sort, 2))
+        return "name COLLATE NOCASE, id"
+
+    @staticmethod
+    def _where(conditions):
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
 
     @staticmethod
     def get_member_by_id(member_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(MemberDaoQueries.get_member_by_id(), (member_id,))
-        member = cursor.fetchone()
-        conn.close()
-        return dict(member) if member else None
+        return MemberService.get_member_versioned(member_id)[0]
+
+    @staticmethod
+    def get_member_versioned(member_id):
+        def load():
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(MemberDaoQueries.get_member_by_id(), (member_id,))
+                return cursor.fetchone()
+
+        return read_through(member_cache, member_id, load)
 
     @staticmethod
     def update_member(member_id, data):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(MemberDaoQueries.update_member(), (data['name'], data['email'], data['join_date'], member_id))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(MemberDaoQueries.update_member(), (data['name'], data['email'], data['join_date'], member_id))
+            conn.commit()
+        member_cache.delete(member_id)
+        member_count_cache.clear()
         return {"message": "Member updated successfully"}
 
     @staticmethod
     def delete_member(member_id):
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(MemberDaoQueries.delete_member_by_id(), (member_id,))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(MemberDaoQueries.delete_member_by_id(), (member_id,))
+            conn.commit()
+        member_cache.delete(member_id)
+        member_count_cache.clear()
         return {"message": "Member deleted successfully"}
@@ -0,0 +1,179 @@
+import bisect
+import threading
+
+# Seconds; covers PBKDF2 hashing and typical request latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> metric, in registration order
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum, in the shape Prometheus expects."""
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                # Per-bucket counts with a final +Inf bucket, then the sum
+                series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """Return ``{labelvalues: {"buckets": [(le, cumulative count)], "count": n, "sum": s}}``."""
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        result = {}
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            result[labels] = {"buckets": buckets, "count": cumulative, "sum": total}
+        return result
+
+
+def _register(cls, name, *args, **kwargs):
+    with _registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name, description, labelnames=()):
+    return _register(Counter, name, description, labelnames)
+
+
+def gauge(name, description, labelnames=()):
+    return _register(Gauge, name, description, labelnames)
+
+
+def histogram(name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, description, labelnames, buckets)
+
+
+def summarize_histogram(metric, *labelvalues):
+    """Count, mean and bucket-interpolated p50/p95/p99 for one series, for JSON stats endpoints."""
+    series = metric.snapshot().get(labelvalues)
+    if not series or not series["count"]:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None}
+    return {
+        "count": series["count"],
+        "mean": series["sum"] / series["count"],
+        "p50": _quantile(series["buckets"], series["count"], 0.50),
+        "p95": _quantile(series["buckets"], series["count"], 0.95),
+        "p99": _quantile(series["buckets"], series["count"], 0.99),
+    }
+
+
+def _quantile(buckets, count, q):
+    rank = q * count
+    lower_bound, lower_count = 0.0, 0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float('inf'):
+                return lower_bound
+            fraction = (rank - lower_count) / (cumulative - lower_count) if cumulative > lower_count else 0
+            return lower_bound + (bound - lower_bound) * fraction
+        lower_bound, lower_count = bound, cumulative
+    return lower_bound
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render_prometheus(extra_gauges=()):
+    """Render every registered metric in the Prometheus text exposition format.
+
+    ``extra_gauges`` holds ``(name, description, {((label, value), ...): sample})`` families
+    computed at scrape time, such as pool or cache statistics.
+    """
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.append(f"# HELP {metric.name} {_escape_help(metric.description)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == 'histogram':
+            for labelvalues, series in sorted(metric.snapshot().items()):
+                labels = list(zip(metric.labelnames, labelvalues))
+                for bound, cumulative in series["buckets"]:
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    lines.append(f"{metric.name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_format_value(series['sum'])}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {series['count']}")
+        else:
+            for labelvalues, value in sorted(metric.snapshot().items()):
+                lines.append(f"{metric.name}{_labels(zip(metric.labelnames, labelvalues))} {_format_value(value)}")
+    for name, description, samples in extra_gauges:
+        lines.append(f"# HELP {name} {_escape_help(description)}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples.items():
+            lines.append(f"{name}{_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+
+
+class InvalidPageRequestError(ValueError):
+    pass
+
+
+def encode_cursor(sort, values):
+    """Pack the sort key and the last row's sort values into an opaque, URL-safe token."""
+    payload = json.dumps({"s": sort, "v": list(values)}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+
+def decode_cursor(token, sort, size):
+    """Return the sort values stored in ``token``, checking it was issued for ``sort``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+        token_sort = payload["s"]
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise InvalidPageRequestError("Malformed cursor")
+    if token_sort != sort:
+        raise InvalidPageRequestError(f"Cursor was issued for sort '{token_sort}', not '{sort}'")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageRequestError("Malformed cursor")
+    # Values are bound straight into SQL, so only accept what sort columns can hold
+    if not all(value is None or isinstance(value, (str, int, float)) and not isinstance(value, bool)
+               for value in values):
+        raise InvalidPageRequestError("Malformed cursor")
+    return values
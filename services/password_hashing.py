@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from services.metrics import counter, gauge, histogram
+
+# PBKDF2 releases the GIL, so each worker can keep one core busy; hashing beyond that only queues
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+# Verifications allowed to run or wait at once; further logins are turned away instead of piling up
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+hash_seconds = histogram('auth_password_hash_seconds', 'Time spent computing password hashes',
+                         ('operation',), HASH_BUCKETS)
+hash_wait_seconds = histogram('auth_password_hash_wait_seconds', 'Time password hashes waited for a worker',
+                              ('operation',), HASH_BUCKETS)
+hash_rejections = counter('auth_password_hash_rejected_total',
+                          'Password hashes refused because the worker pool was saturated', ('operation',))
+hash_pending = gauge('auth_password_hash_pending', 'Password hashes running or waiting for a worker')
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+class PasswordHashingBusyError(Exception):
+    pass
+
+
+def verify_password(password_hash, password):
+    return _run('verify', check_password_hash, password_hash, password)
+
+
+def hash_password(password):
+    return _run('generate', generate_password_hash, password)
+
+
+def _run(operation, function, *args):
+    """Run a hash on the bounded worker pool and wait for its result.
+
+    Request threads only block on the result, so a burst of logins costs at most
+    PASSWORD_HASH_WORKERS cores while other requests keep being served.
+    """
+    if not _slots.acquire(blocking=False):
+        hash_rejections.inc(operation)
+        raise PasswordHashingBusyError("Too many password checks in progress")
+    hash_pending.inc()
+    submitted_at = time.perf_counter()
+    try:
+        future = _executor.submit(_timed, operation, submitted_at, function, *args)
+    except BaseException:
+        _release()
+        raise
+    # The slot is held until the hash finishes, even if the caller stops waiting for it
+    future.add_done_callback(lambda _: _release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        hash_rejections.inc(operation)
+        raise PasswordHashingBusyError("Timed out waiting for a password check")
+
+
+def _timed(operation, submitted_at, function, *args):
+    started_at = time.perf_counter()
+    hash_wait_seconds.observe(started_at - submitted_at, operation)
+    try:
+        return function(*args)
+    finally:
+        hash_seconds.observe(time.perf_counter() - started_at, operation)
+
+
+def _release():
+    hash_pending.dec()
+    _slots.release()
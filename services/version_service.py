@@ -0,0 +1,17 @@
+from config.sqlite_config import db_connection
+from dao.table_version_dao_queries import TableVersionDaoQueries
+
+BOOKS = 'Books'
+MEMBERS = 'Members'
+LOANS = 'Loan'
+
+
+class VersionService:
+    @staticmethod
+    def get_table_versions(*tables):
+        """Return the change counters of ``tables`` in the order given; triggers bump them on every write."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(TableVersionDaoQueries.get_table_versions(len(tables)), tables)
+            versions = dict(cursor.fetchall())
+        return tuple(versions.get(table, 0) for table in tables)
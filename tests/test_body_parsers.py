@@ -0,0 +1,70 @@
+import io
+import os
+
+import pytest
+
+from config import sqlite_config
+from config.migrations import migrate
+from controllers.body_parsers import MalformedBodyError, iter_csv, iter_json_array, iter_ndjson
+from services import book_service
+from services.book_service import BookService
+from services.cache import CACHES
+
+HEADER = b'title,author,published_date,isbn,number_of_pages,cover_image,language,available_copies\n'
+
+
+def csv_row(number):
+    return f'Book {number},Author,2020-01-01,isbn-{number},100,,English,1\n'.encode()
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = os.path.join(tmp_path, 'import.db')
+    migrate(path)
+    previous_pool = sqlite_config.pool
+    sqlite_config.configure_pool(path)
+    yield path
+    sqlite_config.pool.close()
+    sqlite_config.pool = previous_pool
+    for cache in CACHES.values():
+        cache.clear()
+
+
+def test_csv_with_an_unterminated_quote_is_malformed():
+    with pytest.raises(MalformedBodyError, match='Malformed CSV'):
+        list(iter_csv(io.BytesIO(HEADER + b'"Unterminated,Author,2020-01-01,isbn,1,,English,1\n')))
+
+
+def test_csv_with_an_oversized_field_is_malformed():
+    with pytest.raises(MalformedBodyError):
+        list(iter_csv(io.BytesIO(HEADER + b'"' + b'x' * 200000 + b'",Author,2020-01-01,isbn,1,,English,1\n')))
+
+
+@pytest.mark.parametrize('parser, body', [
+    (iter_csv, HEADER + b'Caf\xe9,Author,2020-01-01,isbn,1,,English,1\n'),
+    (iter_ndjson, b'{"title": "Caf\xe9"}\n'),
+    (iter_json_array, b'[{"title": "Caf\xe9"}]'),
+])
+def test_body_that_is_not_utf8_is_malformed(parser, body):
+    with pytest.raises(MalformedBodyError, match='UTF-8'):
+        list(parser(io.BytesIO(body)))
+
+
+def test_malformed_csv_keeps_committed_batches_and_reports(database, monkeypatch):
+    monkeypatch.setattr(book_service, 'IMPORT_BATCH_SIZE', 2)
+    body = HEADER + csv_row(1) + csv_row(2) + csv_row(3) + b'"Unterminated,Author\n'
+
+    summary = BookService.import_books(iter_csv(io.BytesIO(body)))
+
+    assert summary['received'] == 3
+    assert summary['inserted'] == 3
+    assert 'Malformed CSV' in summary['error']
+    assert BookService.get_books(count='exact')[1] == 3
+
+
+def test_undecodable_csv_is_reported(database):
+    summary = BookService.import_books(iter_csv(io.BytesIO(HEADER + csv_row(1) + b'\xff\xfe\n')))
+
+    # The text wrapper decodes ahead of the rows it has handed out, so no row precedes the error here
+    assert summary['inserted'] == 0
+    assert summary['error'].endswith('Body is not valid UTF-8')
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+import pytest
+
+from config.migrations import migrate
+from config.query_plan_check import ALLOWED_FULL_SCANS, NOT_STATEMENTS, check, dao_queries, full_scans, scanned_tables
+
+
+@pytest.fixture
+def connection(tmp_path):
+    database = os.path.join(tmp_path, 'plans.db')
+    migrate(database)
+    connection = sqlite3.connect(database)
+    yield connection
+    connection.close()
+
+
+def test_every_query_prepares_and_reads_through_an_index():
+    failures = check()
+    assert not failures, '\n'.join(f"{name}: {problem}\n    {sql}" for name, problem, sql in failures)
+
+
+def test_only_known_fragments_are_skipped():
+    names = {name for name, _ in dao_queries()}
+    assert set(NOT_STATEMENTS) <= names
+
+
+def test_sql_that_does_not_prepare_is_an_error(connection):
+    with pytest.raises(sqlite3.Error):
+        full_scans(connection, "SELECT * FROM Books WHERE missing_column = ?")
+
+
+def test_unindexed_filter_is_a_full_scan(connection):
+    assert full_scans(connection, "SELECT * FROM Members WHERE join_date = ?") == ['Members']
+    assert full_scans(connection, "SELECT * FROM Members WHERE email = ?") == []
+
+
+@pytest.mark.parametrize('detail', ['SCAN Books', 'SCAN TABLE Books'])
+def test_full_scan_is_recognised_in_old_and_new_plan_formats(detail):
+    assert scanned_tables([detail]) == ['Books']
+
+
+@pytest.mark.parametrize('detail', [
+    'SCAN Books USING INDEX idx_books_published_date_id',
+    'SCAN TABLE Books USING COVERING INDEX idx_books_published_date_id',
+    'SEARCH Books USING INTEGER PRIMARY KEY (rowid=?)',
+    'SEARCH TABLE Books USING INTEGER PRIMARY KEY (rowid=?)',
+    'SCAN Books_fts VIRTUAL TABLE INDEX 0:M4',
+    'SCAN TABLE Books_fts VIRTUAL TABLE INDEX 0:M4',
+])
+def test_index_reads_are_not_full_scans(detail):
+    assert scanned_tables([detail]) == []
+
+
+def test_allowed_full_scans_name_existing_scenarios():
+    from config.query_plan_check import StatementRecorder, scenarios
+
+    names = [name for name, _ in scenarios(StatementRecorder())]
+    assert set(ALLOWED_FULL_SCANS) <= set(names)
+    assert len(names) == len(set(names))